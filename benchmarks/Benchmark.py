@@ -0,0 +1,238 @@
+'''
+Times the pathfinders on generated mazes (see MazeGenerator.py) and compares
+the results with a saved baseline, so that performance changes show up.
+
+=== Solvers ===
+  bfs = the classwork-1 Pathfinder.solve, to the nearest goal
+  astar = the homework-1 getDirectionsToGoal, to the first goal
+  solve = the homework-1 multi-goal solve, through every goal
+
+Both assignments have modules of the same names (MazeProblem, Pathfinder,
+...), so each is loaded on its own and kept out of sys.modules.
+
+=== Results ===
+Each run of a solver on a case (kind, width x height, goal count) reports
+the seconds taken, the nodes expanded per second (from the solver's
+SearchStats), and the peak bytes traced by tracemalloc in a second, traced
+run. Compiling the maze is timed separately, as the "compile" solver.
+
+=== Baselines ===
+With --save the results are written as JSON; with --baseline the results of
+a saved run are compared case by case, and any run more than --tolerance
+(and --floor seconds) slower than its baseline is reported as a regression
+(exit status 1).
+
+Usage, from this directory (without --run, the module runs its tests):
+  python Benchmark.py --run --sizes 100 500 --goals 1 6 --save baseline.json
+  python Benchmark.py --run --sizes 100 500 --goals 1 6 --baseline baseline.json
+'''
+import unittest
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from MazeGenerator import KINDS, classworkMaze, generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOLVERS = ("compile", "bfs", "astar", "solve")
+
+
+# Imports the named modules of the assignment in directory<str> (relative
+# to the repository root), with that directory first on the import path.
+# Modules of the same names loaded before are restored afterwards, and the
+# assignment's own are left out of sys.modules; returns a dict of them
+def loadAssignment(directory, names):
+    path = os.path.join(ROOT, directory)
+    local = {name[:-3] for name in os.listdir(path) if name.endswith(".py")}
+    shadowed = {name: sys.modules.pop(name) for name in local if name in sys.modules}
+    sys.path.insert(0, path)
+    try:
+        return {name: importlib.import_module(name) for name in names}
+    finally:
+        sys.path.remove(path)
+        for name in local:
+            sys.modules.pop(name, None)
+        sys.modules.update(shadowed)
+
+
+# Builds the callables that run each solver on a generated maze. Each takes
+# the case (maze, initial, goals) and returns (run, stats), where run() runs
+# the solver once, filling in the SearchStats stats
+def makeSolvers():
+    classwork = loadAssignment("classwork-1", ["MazeProblem", "Pathfinder", "SearchStats"])
+    homework = loadAssignment("homework-1", ["MazeProblem", "Pathfinder", "SearchStats"])
+    # The homework-1 problem of the latest case, shared by its solvers
+    compiled = [None, None]
+
+    def homeworkProblem(case):
+        if compiled[0] is not case:
+            compiled[:] = [case, homework["MazeProblem"].MazeProblem(case[0])]
+        problem = compiled[1]
+        problem.distanceCache = None
+        return problem
+
+    def compileMaze(case):
+        stats = homework["SearchStats"].SearchStats()
+        return (lambda: homework["MazeProblem"].MazeProblem(case[0]), stats)
+
+    def bfs(case):
+        problem = classwork["MazeProblem"].MazeProblem(classworkMaze(*case))
+        stats = classwork["SearchStats"].SearchStats()
+        return (lambda: classwork["Pathfinder"].Pathfinder.solve(problem, stats=stats), stats)
+
+    def astar(case):
+        problem = homeworkProblem(case)
+        stats = homework["SearchStats"].SearchStats()
+        pathfinder = homework["Pathfinder"]
+        return (lambda: pathfinder.getDirectionsToGoal(problem, case[1], case[2][0],
+                                                       stats=stats), stats)
+
+    def solve(case):
+        problem = homeworkProblem(case)
+        stats = homework["SearchStats"].SearchStats()
+
+        def run():
+            problem.distanceCache = None
+            homework["Pathfinder"].solve(problem, case[1], case[2], stats=stats)
+        return (run, stats)
+
+    return {"compile": compileMaze, "bfs": bfs, "astar": astar, "solve": solve}
+
+
+# Times one solver on the case: the best of repeat untraced runs, then one
+# run under tracemalloc for the peak memory. Returns the result dict
+def measure(name, solver, case, repeat=1, memory=True):
+    best = None
+    for _ in range(repeat):
+        run, stats = solver(case)
+        began = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - began
+        if best is None or seconds < best[0]:
+            best = (seconds, stats)
+    seconds, stats = best
+    result = {"solver": name,
+              "seconds": seconds,
+              "expanded": stats.expanded,
+              "nodesPerSecond": stats.expanded / seconds if seconds > 0 else 0.0,
+              "peakBytes": None}
+    if memory:
+        run, _ = solver(case)
+        tracemalloc.start()
+        try:
+            run()
+            result["peakBytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+# Runs every solver on every case of the given kinds, sizes (square, in
+# cells per side) and goal counts, returning the list of result dicts
+def runBenchmarks(kinds, sizes, goalCounts, seed=0, solvers=SOLVERS, repeat=1,
+                  memory=True, log=None):
+    available = makeSolvers()
+    results = []
+    for kind in kinds:
+        for size in sizes:
+            for goals in goalCounts:
+                case = generate(kind, size, size, goals, seed)
+                name = "%s-%dx%d-g%d" % (kind, size, size, goals)
+                for solver in solvers:
+                    result = measure(solver, available[solver], case, repeat, memory)
+                    result["case"] = name
+                    results.append(result)
+                    if log is not None:
+                        log(formatResult(result))
+    return results
+
+
+def formatResult(result, baseline=None):
+    line = "%-28s %-8s %10.4fs %12.0f nodes/s" % (
+        result["case"], result["solver"], result["seconds"], result["nodesPerSecond"])
+    if result["peakBytes"] is not None:
+        line += " %10.1f MiB" % (result["peakBytes"] / 2 ** 20)
+    if baseline is not None:
+        line += "  x%.2f" % (result["seconds"] / baseline["seconds"]
+                             if baseline["seconds"] > 0 else 1.0)
+    return line
+
+
+# Compares results with baseline results (as saved by --save), returning the
+# list of (result, baseline result) pairs of the runs more than tolerance
+# (a fraction) and more than floor seconds slower than their baseline, so
+# that timer noise on tiny cases is not flagged; runs missing from either
+# side are skipped
+def compare(results, baseline, tolerance=0.2, floor=0.005):
+    saved = {(result["case"], result["solver"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = saved.get((result["case"], result["solver"]))
+        if before is None:
+            continue
+        seconds = result["seconds"]
+        if seconds > before["seconds"] * (1 + tolerance) and seconds - before["seconds"] > floor:
+            regressions.append((result, before))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the pathfinders.")
+    parser.add_argument("--kinds", nargs="+", default=sorted(KINDS), choices=sorted(KINDS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 500])
+    parser.add_argument("--goals", nargs="+", type=int, default=[1, 6])
+    parser.add_argument("--solvers", nargs="+", default=list(SOLVERS), choices=SOLVERS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", dest="memory", action="store_false")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--floor", type=float, default=0.005,
+                        help="ignore slowdowns of fewer seconds than this")
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.kinds, args.sizes, args.goals, args.seed, args.solvers,
+                            args.repeat, args.memory, log=print)
+    if args.save:
+        with open(args.save, "w") as out:
+            json.dump(results, out, indent=1)
+    if args.baseline:
+        with open(args.baseline) as saved:
+            regressions = compare(results, json.load(saved), args.tolerance, args.floor)
+        for result, before in regressions:
+            print("REGRESSION " + formatResult(result, before))
+        return 1 if regressions else 0
+    return 0
+
+
+class BenchmarkTests(unittest.TestCase):
+
+    def test_load_assignment(self):
+        classwork = loadAssignment("classwork-1", ["MazeProblem"])
+        homework = loadAssignment("homework-1", ["MazeProblem"])
+        self.assertEqual(classwork["MazeProblem"].MazeProblem.actions, "URDL")
+        self.assertEqual(homework["MazeProblem"].MazeProblem.actions, "UDLR")
+        self.assertTrue("MazeProblem" not in sys.modules)
+
+    def test_run(self):
+        results = runBenchmarks(["rooms", "backtracker"], [12], [1, 3])
+        self.assertEqual(len(results), 2 * 2 * len(SOLVERS))
+        for result in results:
+            self.assertTrue(result["seconds"] >= 0 and result["peakBytes"] > 0)
+            if result["solver"] != "compile":
+                self.assertTrue(result["expanded"] > 0)
+        slower = [dict(result, seconds=result["seconds"] * 2 + 1) for result in results]
+        self.assertEqual(compare(results, slower), [])
+        self.assertEqual(len(compare(slower, results)), len(results))
+
+
+if __name__ == '__main__':
+    if "--run" in sys.argv[1:]:
+        sys.exit(main([arg for arg in sys.argv[1:] if arg != "--run"]))
+    else:
+        unittest.main()
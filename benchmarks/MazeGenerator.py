@@ -0,0 +1,170 @@
+'''
+Seeded procedural mazes for benchmarking the pathfinders, from 10x10 up to
+4000x4000 cells.
+
+=== Kinds ===
+  backtracker = a perfect maze carved by the recursive backtracker: one
+                cell wide corridors and no loops
+  rooms = open rooms with mud noise, separated by walls with a doorway into
+          each neighboring room
+  corridors = long straight corridors, each branching off an earlier one,
+              crossing into a network with many loops
+
+=== Output ===
+generate returns (maze, initial, goals): the maze as a list of strings in
+the homework-1 format ("X" walls, "." clear, "M" mud, with a border of
+walls), and distinct open initial and goal states, all of them connected.
+The same arguments always give the same maze. classworkMaze renders it in
+the classwork-1 format, with "*" and "G" marking the states and mud clear.
+'''
+import unittest
+import random
+
+# Chance of a rooms maze cell being mud
+MUD = 0.2
+
+
+# Carves a perfect maze with an iterative recursive backtracker over the
+# cells at odd coordinates, knocking down the wall between each cell and
+# the unvisited neighbor it moves on to
+def backtrackerMaze(rows, rng):
+    height = len(rows)
+    width = len(rows[0])
+    rows[1][1] = ord(".")
+    stack = [(1, 1)]
+    steps = ((0, -2), (0, 2), (-2, 0), (2, 0))
+    while stack:
+        x, y = stack[-1]
+        options = [(x + dx, y + dy) for dx, dy in steps
+                   if 0 < x + dx < width - 1 and 0 < y + dy < height - 1
+                   and rows[y + dy][x + dx] == ord("X")]
+        if not options:
+            stack.pop()
+            continue
+        nx, ny = rng.choice(options)
+        rows[(y + ny) // 2][(x + nx) // 2] = ord(".")
+        rows[ny][nx] = ord(".")
+        stack.append((nx, ny))
+
+
+# Opens the interior, raises walls every roomSize cells with a random
+# doorway in each wall segment, then scatters mud
+def roomsMaze(rows, rng, roomSize=12):
+    height = len(rows)
+    width = len(rows[0])
+    for y in range(1, height - 1):
+        rows[y][1:width - 1] = b"." * (width - 2)
+    for x0 in range(roomSize, width - 1, roomSize):
+        for y0 in range(1, height - 1, roomSize):
+            y1 = min(y0 + roomSize - 1, height - 1)
+            for y in range(y0, y1):
+                rows[y][x0] = ord("X")
+            rows[rng.randrange(y0, y1)][x0] = ord(".")
+    for y0 in range(roomSize, height - 1, roomSize):
+        for x0 in range(1, width - 1, roomSize):
+            x1 = min(x0 + roomSize - 1, width - 1)
+            for x in range(x0, x1):
+                rows[y0][x] = ord("X")
+            rows[y0][rng.randrange(x0, x1)] = ord(".")
+    for y in range(1, height - 1):
+        row = rows[y]
+        for x in range(1, width - 1):
+            if row[x] == ord(".") and rng.random() < MUD:
+                row[x] = ord("M")
+
+
+# Carves a first corridor across the middle, then corridors starting from
+# random open cells, so that every corridor meets an earlier one, until
+# about a third of the interior is open
+def corridorMaze(rows, rng):
+    height = len(rows)
+    width = len(rows[0])
+    middle = height // 2
+    rows[middle][1:width - 1] = b"." * (width - 2)
+    opened = [(x, middle) for x in range(1, width - 1)]
+    target = (width - 2) * (height - 2) // 3
+    count = len(set(opened))
+    while count < target:
+        x, y = rng.choice(opened)
+        dx, dy = rng.choice(((0, -1), (0, 1), (-1, 0), (1, 0)))
+        for _ in range(rng.randint(2, max(2, max(width, height) // 3))):
+            x += dx
+            y += dy
+            if not (0 < x < width - 1 and 0 < y < height - 1):
+                break
+            if rows[y][x] == ord("X"):
+                rows[y][x] = ord(".")
+                opened.append((x, y))
+                count += 1
+
+
+KINDS = {"backtracker": backtrackerMaze,
+         "rooms": roomsMaze,
+         "corridors": corridorMaze}
+
+
+# Generates the maze of the given kind and size, with goals goal states,
+# from the seed; see the module docstring
+def generate(kind, width, height, goals=1, seed=0):
+    rng = random.Random("%s-%d-%d-%d" % (kind, width, height, seed))
+    rows = [bytearray(b"X" * width) for _ in range(height)]
+    KINDS[kind](rows, rng)
+
+    # Sample the states by rejection, which stays cheap on large mazes
+    count = goals + 1
+    states = []
+    seen = set()
+    while len(states) < count:
+        x, y = rng.randrange(1, width - 1), rng.randrange(1, height - 1)
+        if rows[y][x] != ord("X") and (x, y) not in seen:
+            seen.add((x, y))
+            states.append((x, y))
+    maze = [row.decode("ascii") for row in rows]
+    return (maze, states[0], states[1:])
+
+
+# Renders a generated maze in the classwork-1 format
+def classworkMaze(maze, initial, goals):
+    rows = [bytearray(row.replace("M", "."), "ascii") for row in maze]
+    for x, y in goals:
+        rows[y][x] = ord("G")
+    rows[initial[1]][initial[0]] = ord("*")
+    return [row.decode("ascii") for row in rows]
+
+
+class MazeGeneratorTests(unittest.TestCase):
+
+    def reachable(self, maze, initial):
+        seen = {initial}
+        stack = [initial]
+        while stack:
+            x, y = stack.pop()
+            for n in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
+                if n not in seen and maze[n[1]][n[0]] != "X":
+                    seen.add(n)
+                    stack.append(n)
+        return seen
+
+    def test_generate(self):
+        for kind in KINDS:
+            for width, height in ((10, 10), (31, 17), (64, 40)):
+                maze, initial, goals = generate(kind, width, height, goals=5, seed=3)
+                self.assertEqual(generate(kind, width, height, goals=5, seed=3),
+                                 (maze, initial, goals))
+                self.assertEqual((len(maze), {len(row) for row in maze}), (height, {width}))
+                self.assertEqual(maze[0] + maze[-1], "X" * (2 * width))
+                self.assertTrue(all(row[0] == row[-1] == "X" for row in maze))
+                self.assertEqual(len(set([initial] + goals)), 6)
+                self.assertTrue(set(goals) <= self.reachable(maze, initial))
+            self.assertNotEqual(generate(kind, 40, 40, seed=1), generate(kind, 40, 40, seed=2))
+
+    def test_classwork_maze(self):
+        maze, initial, goals = generate("rooms", 30, 30, goals=2)
+        rendered = classworkMaze(maze, initial, goals)
+        self.assertEqual(rendered[initial[1]][initial[0]], "*")
+        self.assertEqual(sum(row.count("G") for row in rendered), 2)
+        self.assertFalse(any("M" in row for row in rendered))
+
+
+if __name__ == '__main__':
+    unittest.main()
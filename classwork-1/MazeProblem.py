@@ -48,8 +48,14 @@ For example, if an agent is at state (1, 1), and can only move right and down,
 then the transitions for that s = (1, 1) would be:
 [("R", (2, 1)), ("D", (1, 2))]
 '''
+from array import array
+
 class MazeProblem:
 
+    # Actions in the order transitions reports them; the compiled maze
+    # stores actions as indices into this string
+    actions = "URDL"
+
     # MazeProblem Constructor:
     # Constructs a new pathfinding problem from a maze, described above
     def __init__(self, maze):
@@ -63,19 +69,72 @@ class MazeProblem:
 
         # extract the 'G' (goal) and '*' (initial) state(s) from the maze and
         # updates the respective attributes
-        for row in self.maze:
-            if 'G' in row:
-                self.goals.append((row.find('G'), self.maze.index(row)))
-            if '*' in row:
-                self.initial = (row.find('*'), self.maze.index(row))
+        for y, row in enumerate(self.maze):
+            for x, symbol in enumerate(row):
+                if symbol == 'G':
+                    self.goals.append((x, y))
+                elif symbol == '*':
+                    self.initial = (x, y)
 
             # If the self.goals or self.initial is not populated, print some error
         if not self.goals or not self.initial:
             print("No goal or initial state in the given maze.")
 
-
-
-
+        self.compile()
+
+    # compile builds the array-backed form of the maze that the search runs
+    # on. Cells are numbered id = y * width + x, and:
+    # - grid[id] is 1 for open cells, 0 for walls
+    # - the neighbors of a cell occupy slots [4 * id, 4 * id + degree[id])
+    #   of nbrCell / nbrAction, in U, R, D, L order
+    def compile(self):
+        maze = self.maze
+        self.height = height = len(maze)
+        self.width = width = max((len(row) for row in maze), default=0)
+        size = width * height
+
+        table = bytes(0 if chr(b) == "X" else 1 for b in range(256))
+        grid = bytearray(size)
+        for y, row in enumerate(maze):
+            grid[y * width:y * width + len(row)] = row.encode("latin-1").translate(table)
+
+        degree = bytearray(size)
+        nbrCell = array("i", [0]) * (4 * size)
+        nbrAction = bytearray(4 * size)
+        for y in range(height):
+            base = y * width
+            for x in range(width):
+                cell = base + x
+                slot = 4 * cell
+                if y > 0 and grid[cell - width]:
+                    nbrCell[slot] = cell - width
+                    slot += 1
+                if x < width - 1 and grid[cell + 1]:
+                    nbrCell[slot] = cell + 1
+                    nbrAction[slot] = 1
+                    slot += 1
+                if y < height - 1 and grid[cell + width]:
+                    nbrCell[slot] = cell + width
+                    nbrAction[slot] = 2
+                    slot += 1
+                if x > 0 and grid[cell - 1]:
+                    nbrCell[slot] = cell - 1
+                    nbrAction[slot] = 3
+                    slot += 1
+                degree[cell] = slot - 4 * cell
+
+        self.grid = grid
+        self.degree = degree
+        self.nbrCell = nbrCell
+        self.nbrAction = nbrAction
+
+    # cellId returns the compiled maze's integer id of the given state
+    def cellId(self, state):
+        return state[1] * self.width + state[0]
+
+    # cellState returns the (x, y) state of the given compiled cell id
+    def cellState(self, cell):
+        return (cell % self.width, cell // self.width)
 
     # goalTest is parameterized by a state, and
     # returns True if the given state is a goal, False otherwise
@@ -88,21 +147,14 @@ class MazeProblem:
     # corresponding to allowable actions of the given state, as well
     # as the next state the action leads to
     def transitions(self, state):
-        # TODO: Implement as intended
-        result = []
-        rowIndex = state[1]
-        colIndex = state[0]
-
-        if self.maze[rowIndex - 1][colIndex] != 'X':
-            result.append(('U', (colIndex, rowIndex - 1)))
-        if self.maze[rowIndex][colIndex + 1] != 'X':
-            result.append(('R', (colIndex + 1, rowIndex)))
-        if self.maze[rowIndex + 1][colIndex] != 'X':
-            result.append(('D', (colIndex, rowIndex + 1)))
-        if self.maze[rowIndex][colIndex - 1] != 'X':
-            result.append(('L', (colIndex - 1, rowIndex)))
-
-        return result
+        # A view on the compiled neighbor table
+        width = self.width
+        cell = state[1] * width + state[0]
+        start = 4 * cell
+        nbrCell = self.nbrCell
+        return [(MazeProblem.actions[self.nbrAction[k]],
+                 (nbrCell[k] % width, nbrCell[k] // width))
+                for k in range(start, start + self.degree[cell])]
 
     # solnTest will return a tuple of the format (cost, isSoln) where:
     # cost = the total cost of the solution,
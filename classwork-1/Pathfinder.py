@@ -5,13 +5,24 @@ sequence of actions) that takes the agent from the initial state to the
 optimal goal state.
 
 This task is done in the Pathfinder.solve method, as parameterized
-by a maze pathfinding problem, and is aided by the SearchTreeNode DS.
+by a maze pathfinding problem, and is aided by the SearchArrays DS
+(SearchTreeNodes give a view of it for debugging).
 '''
 
 from MazeProblem import *
-from SearchTreeNode import SearchTreeNode
-from queue import *
+from SearchTreeNode import SearchArrays, UNREACHED
+from SearchStats import SearchStats
+import time
 import unittest
+import json
+
+# popcount returns the number of set bits of the int x; int.bit_count only
+# exists from Python 3.10 on
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count
+else:
+    def popcount(x):
+        return bin(x).count("1")
 
 class Pathfinder:
 
@@ -20,28 +31,137 @@ class Pathfinder:
     # return a list of actions that solves that problem. An
     # example returned list might look like:
     # ["U", "R", "R", "U"]
-    def createPath(node):
-        result = []
-        while node.parent: # pylint: disable=no-member
-            result.insert(0, node.action) # pylint: disable=no-member
-            node = node.parent # pylint: disable=no-member
+    # The BFS keeps its queue as a list of cell ids and the search tree in
+    # a SearchArrays, whose g is each cell's depth. Given a SearchStats as
+    # stats, the search, its time and the goal reached are recorded there
+    def solve(problem, wavefront=False, stats=None):
+        if wavefront:
+            return Pathfinder.solveWavefront(problem, stats)
+        track = stats is not None
+        if track:
+            began = time.perf_counter()
+        degree = problem.degree
+        nbrCell = problem.nbrCell
+        nbrAction = problem.nbrAction
+        goals = bytearray(len(problem.grid))
+        for goal in problem.goals:
+            goals[problem.cellId(goal)] = 1
+        store = SearchArrays(len(problem.grid), MazeProblem.actions)
+        depth = store.g
+        parents = store.parent
+        actions = store.action
+
+        start = problem.cellId(problem.initial)
+        depth[start] = 0
+        queue = [start]
+        expanded = peak = 0
+        found = -1
+        for cell in queue:
+            if track and len(queue) - expanded > peak:
+                peak = len(queue) - expanded
+            if goals[cell]:
+                found = cell
+                break
+            expanded += 1
+            slot = 4 * cell
+            for k in range(slot, slot + degree[cell]):
+                n = nbrCell[k]
+                if depth[n] == UNREACHED:
+                    depth[n] = depth[cell] + 1
+                    parents[n] = cell
+                    actions[n] = nbrAction[k]
+                    queue.append(n)
+
+        if track:
+            searched = time.perf_counter()
+        result = [] if found < 0 else list(store.path(found))
+        if track:
+            stats.addSearch(len(queue), expanded, len(queue), peak)
+            Pathfinder.recordLeg(problem, stats, found, began, searched)
         return result
 
-    def solve(problem):
-        queue = Queue()
-        closedList = []
-        queue.put(SearchTreeNode(problem.initial, None, None)) # pylint: disable=no-member
-        while queue:
-            parent = queue.get()
-            if problem.goalTest(parent.state): # pylint: disable=no-member
-                return Pathfinder.createPath(parent)
-            possibleMoves = problem.transitions(parent.state)# pylint: disable=no-member
-            for move in possibleMoves:
-                if move[1] not in closedList:
-                    queue.put(SearchTreeNode(move[1], move[0], parent))
-                    closedList.append(move[1])
-
-        return []
+    # recordLeg records the leg from the initial state to the goal cell
+    # found (-1 for none) in stats, with the times its search began and
+    # ended
+    def recordLeg(problem, stats, found, began, searched):
+        done = time.perf_counter()
+        stats.addPhase("search", searched - began)
+        stats.addPhase("path", done - searched)
+        if found >= 0:
+            stats.addLeg(problem.initial, problem.cellState(found), done - began)
+            stats.goalOrder = [problem.cellState(found)]
+
+    # bitset returns an int whose bit id is set iff cellBits[id] is nonzero,
+    # for a bytes-like cellBits of 0s and 1s
+    def bitset(cellBits):
+        return int(bytes(cellBits).translate(b"01" + bytes(254))[::-1] or b"0", 2)
+
+    # solveWavefront is a BFS that advances the whole frontier at once. Sets
+    # of cells are bitsets (Python ints, bit id for cell id), so that one step
+    # shifts the frontier by one column (L, R) or one row (U, D) against the
+    # open-cell mask. Each newly reached cell records the direction it was
+    # entered by, and the path is backtracked once the frontier meets any goal;
+    # the nearest goal is returned, the lowest cell id among equally near ones
+    def solveWavefront(problem, stats=None):
+        track = stats is not None
+        if track:
+            began = time.perf_counter()
+            peak = 1
+        width = problem.width
+        size = len(problem.grid)
+        openCells = Pathfinder.bitset(problem.grid)
+        goals = 0
+        for goal in problem.goals:
+            goals |= 1 << problem.cellId(goal)
+        # Cells a move right (left) may land on, i.e. not wrapped across rows
+        rightOk = Pathfinder.bitset((b"\0" + b"\1" * (width - 1)) * problem.height) & openCells
+        leftOk = Pathfinder.bitset((b"\1" * (width - 1) + b"\0") * problem.height) & openCells
+
+        start = problem.cellId(problem.initial)
+        frontier = visited = 1 << start
+        # entered[a] holds the cells first reached by action a, in URDL order
+        entered = [0, 0, 0, 0]
+        while not frontier & goals:
+            unseen = ~visited
+            up = (frontier >> width) & openCells & unseen
+            unseen &= ~up
+            right = (frontier << 1) & rightOk & unseen
+            unseen &= ~right
+            down = (frontier << width) & openCells & unseen
+            unseen &= ~down
+            left = (frontier >> 1) & leftOk & unseen
+            frontier = up | right | down | left
+            if not frontier:
+                if track:
+                    reached = popcount(visited)
+                    stats.addSearch(reached, reached, reached, peak)
+                    Pathfinder.recordLeg(problem, stats, -1, began, time.perf_counter())
+                return []
+            visited |= frontier
+            if track:
+                peak = max(peak, popcount(frontier))
+            for a, cells in enumerate((up, right, down, left)):
+                entered[a] |= cells
+
+        if track:
+            searched = time.perf_counter()
+        reached = frontier & goals
+        cell = found = (reached & -reached).bit_length() - 1
+        entered = [cells.to_bytes((size + 7) // 8, "little") for cells in entered]
+        offsets = (-width, 1, width, -1)
+        result = []
+        while cell != start:
+            for a in range(4):
+                if entered[a][cell >> 3] >> (cell & 7) & 1:
+                    result.append(MazeProblem.actions[a])
+                    cell -= offsets[a]
+                    break
+        result.reverse()
+        if track:
+            reached = popcount(visited)
+            stats.addSearch(reached, reached - popcount(frontier), reached, peak)
+            Pathfinder.recordLeg(problem, stats, found, began, searched)
+        return result
 
 class PathfinderTests(unittest.TestCase):
     def test_maze1(self):
@@ -76,6 +196,58 @@ class PathfinderTests(unittest.TestCase):
         self.assertTrue(solnTest[1])
         self.assertEqual(solnTest[0], 10)
 
+    def test_wavefront(self):
+        mazes = [(["XXXXX", "X..GX", "X...X", "X*..X", "XXXXX"], 4),
+                 (["XXXXX", "XG..X", "XX..X", "X*..X", "XXXXX"], 4),
+                 (["XXXXXX", "X*...X", "XXXX.X", "XG...X", "XXXXXX"], 8),
+                 (["XXXXXXX", "X*....X", "XXX.XXX", "X.....X", "X.XXX.X", "X.XG..X", "XXXXXXX"], 10)]
+        for maze, cost in mazes:
+            problem = MazeProblem(maze)
+            soln = Pathfinder.solve(problem, wavefront=True)
+            self.assertEqual(problem.solnTest(soln), (cost, True))
+
+    def test_wavefront_nearest_goal(self):
+        maze = ["XXXXXXX", "XG...GX", "X.X.X.X", "X..*..X", "XGX..GX", "XXXXXXX"]
+        problem = MazeProblem(maze)
+        self.assertEqual(len(problem.goals), 4)
+        soln = Pathfinder.solve(problem, wavefront=True)
+        self.assertEqual(problem.solnTest(soln), (3, True))
+        self.assertEqual(problem.solnTest(Pathfinder.solve(problem)), (3, True))
+
+    def test_search_arrays(self):
+        maze = ["XXXXXX", "X*...X", "XXXX.X", "XG...X", "XXXXXX"]
+        problem = MazeProblem(maze)
+        store = SearchArrays(len(problem.grid), MazeProblem.actions)
+        store.g[problem.cellId((1, 1))] = 0
+        for parent, cell, action in [((1, 1), (2, 1), 1), ((2, 1), (3, 1), 1)]:
+            store.parent[problem.cellId(cell)] = problem.cellId(parent)
+            store.action[problem.cellId(cell)] = action
+            store.g[problem.cellId(cell)] = store.g[problem.cellId(parent)] + 1
+        self.assertEqual(store.path(problem.cellId((3, 1))), "RR")
+        node = store.node(problem.cellId((3, 1)), problem.width)
+        self.assertEqual((node.state, node.action), ((3, 1), "R"))
+        self.assertEqual((node.parent.parent.state, node.parent.parent.action), ((1, 1), None))
+        self.assertTrue(node.parent.parent.parent is None)
+        self.assertEqual(Pathfinder.solve(MazeProblem(["XXXXX", "X*XGX", "XXXXX"])), [])
+
+    def test_stats(self):
+        maze = ["XXXXXXX", "X*....X", "XXX.XXX", "X.....X", "X.XXX.X", "X.XG..X", "XXXXXXX"]
+        problem = MazeProblem(maze)
+        for wavefront in (False, True):
+            stats = SearchStats()
+            soln = Pathfinder.solve(problem, wavefront, stats)
+            self.assertEqual(problem.solnTest(soln), (10, True))
+            report = json.loads(stats.toJSON())
+            self.assertEqual(report["goalOrder"], [[3, 5]])
+            self.assertEqual(sorted(report["phases"]), ["path", "search"])
+            self.assertEqual(report["duplicates"], 0)
+            self.assertTrue(0 < report["expanded"] < report["generated"] <= 17)
+            self.assertTrue(0 < report["peakFrontier"] <= 3)
+            self.assertEqual(len(report["legs"]), 1)
+        stats = SearchStats()
+        self.assertEqual(Pathfinder.solve(MazeProblem(["XXXXX", "X*XGX", "XXXXX"]), True, stats), [])
+        self.assertEqual((stats.generated, stats.expanded, stats.legs), (1, 1, []))
+
 
 
 if __name__ == '__main__':
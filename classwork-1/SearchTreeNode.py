@@ -14,10 +14,61 @@ The action used to transition from the parent to this node.
 The parent of this node in the search tree.
 - The parent's value is None if the initial state
 - The parent's value is a reference to the parent node otherwise
+
+=== SearchArrays ===
+The search itself keeps no node objects: a SearchArrays holds the same
+information for every cell of a compiled maze in parallel typed arrays
+indexed by cell id (parent id, action code, depth g), and rebuilds the
+action string of a path straight from them. SearchTreeNodes remain as a
+view of those arrays for debugging.
 '''
+from array import array
+
+# g of the cells a search has not reached
+UNREACHED = 2**62
+
+
 class SearchTreeNode:
-    
+    __slots__ = ("state", "action", "parent")
+
     def __init__(self, state, action, parent):
         self.state = state
         self.action = action
         self.parent = parent
+
+
+class SearchArrays:
+    __slots__ = ("parent", "action", "g", "table")
+
+    # SearchArrays for a compiled maze of size cells whose action codes index
+    # into the actions<str>; parent[id] is -1 for the root and for cells not
+    # yet reached, which have g[id] == UNREACHED
+    def __init__(self, size, actions):
+        self.parent = array("i", [-1]) * size
+        self.action = bytearray(size)
+        self.g = array("q", [UNREACHED]) * size
+        self.table = bytes.maketrans(bytes(range(len(actions))), actions.encode("ascii"))
+
+    # path returns the string of actions leading from the root to cell
+    def path(self, cell):
+        parent = self.parent
+        action = self.action
+        codes = bytearray()
+        while parent[cell] >= 0:
+            codes.append(action[cell])
+            cell = parent[cell]
+        codes.reverse()
+        return codes.translate(self.table).decode("ascii")
+
+    # node returns the SearchTreeNode view of cell, with the parent chain
+    # up to the root, in a maze of the given width
+    def node(self, cell, width):
+        chain = []
+        while cell >= 0:
+            chain.append(cell)
+            cell = self.parent[cell]
+        node = None
+        for cell in reversed(chain):
+            action = None if node is None else chr(self.table[self.action[cell]])
+            node = SearchTreeNode((cell % width, cell // width), action, node)
+        return node
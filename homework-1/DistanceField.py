@@ -0,0 +1,215 @@
+'''
+DistanceFields hold, for a single goal, the cost of the cheapest path from
+every cell of a compiled MazeProblem to that goal. They are computed once,
+with a Dijkstra search run backwards from the goal over the mud costs, after
+which any start-to-goal leg is a walk down the field with no further search.
+
+=== Fields ===
+A field is an array of signed 64-bit integers indexed by cell id, in which
+field[id] is the cost of moving from the cell to the goal, and unreachable
+cells (walls included) hold UNREACHABLE.
+
+=== Cache ===
+A DistanceFieldCache keeps the fields of one MazeProblem, keyed by goal, and
+evicts the least recently used field once the fields held exceed its memory
+budget in bytes. Fields are dropped as soon as the problem is recompiled.
+'''
+import unittest
+from array import array
+from collections import OrderedDict
+from heapq import heappush, heappop
+from MazeProblem import MazeProblem
+
+UNREACHABLE = 2 ** 62
+
+# Default memory budget of a problem's cache, in bytes
+DEFAULT_BUDGET = 256 * 2 ** 20
+
+
+# Computes the distance field towards the goal<tuple>. Moving from u onto v
+# costs grid[v], so walking backwards from v to u adds v's own cost. The
+# search is recorded in stats, a SearchStats.SearchStats, if given
+def distanceField(problem, goal, stats=None):
+    grid = problem.grid
+    degree = problem.degree
+    nbrCell = problem.nbrCell
+    field = array("q", [UNREACHABLE]) * len(grid)
+    target = problem.cellId(goal)
+    if not grid[target]:
+        return field
+
+    track = stats is not None
+    pushes = expanded = peak = 0
+    field[target] = 0
+    frontier = [(0, target)]
+    while frontier:
+        if track and len(frontier) > peak:
+            peak = len(frontier)
+        d, cell = heappop(frontier)
+        if d > field[cell]:
+            continue
+        expanded += 1
+        nd = d + grid[cell]
+        slot = cell << 2
+        for k in range(slot, slot + degree[cell]):
+            n = nbrCell[k]
+            if nd < field[n]:
+                field[n] = nd
+                pushes += 1
+                heappush(frontier, (nd, n))
+    if track:
+        stats.addSearch(pushes + 1, expanded, expanded, peak)
+    return field
+
+
+# Walks the field from the initial state<tuple> down to its goal, returning
+# the list of actions taken, or None if the goal is unreachable
+def descendField(problem, field, initial):
+    actions = MazeProblem.actions
+    degree = problem.degree
+    nbrCell = problem.nbrCell
+    nbrCost = problem.nbrCost
+    nbrAction = problem.nbrAction
+    cell = problem.cellId(initial)
+    if field[cell] >= UNREACHABLE:
+        return None
+
+    result = []
+    while field[cell]:
+        slot = cell << 2
+        for k in range(slot, slot + degree[cell]):
+            if field[nbrCell[k]] + nbrCost[k] == field[cell]:
+                result.append(actions[nbrAction[k]])
+                cell = nbrCell[k]
+                break
+    return result
+
+
+class DistanceFieldCache:
+
+    def __init__(self, problem, budget=DEFAULT_BUDGET):
+        self.problem = problem
+        self.budget = budget
+        self.version = problem.version
+        self.fields = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    # clear drops every cached field
+    def clear(self):
+        self.fields.clear()
+        self.used = 0
+
+    # cached returns the distance field towards the goal<tuple> if the cache
+    # holds it, or None, without computing anything
+    def cached(self, goal):
+        if self.version != self.problem.version:
+            self.clear()
+            self.version = self.problem.version
+
+        fields = self.fields
+        if goal not in fields:
+            return None
+        self.hits += 1
+        fields.move_to_end(goal)
+        return fields[goal]
+
+    # field returns the distance field towards the goal<tuple>, computing it
+    # on a miss (recorded in stats, if given); a field larger than the whole
+    # budget is returned uncached
+    def field(self, goal, stats=None):
+        field = self.cached(goal)
+        if field is not None:
+            return field
+
+        fields = self.fields
+        self.misses += 1
+        field = distanceField(self.problem, goal, stats)
+        size = field.itemsize * len(field)
+        if size <= self.budget:
+            while fields and self.used + size > self.budget:
+                _, evicted = fields.popitem(last=False)
+                self.used -= evicted.itemsize * len(evicted)
+            fields[goal] = field
+            self.used += size
+        return field
+
+    # distance returns the cost of the cheapest path from initial<tuple> to
+    # goal<tuple>, or None if there is none
+    def distance(self, initial, goal, stats=None):
+        d = self.field(goal, stats)[self.problem.cellId(initial)]
+        return d if d < UNREACHABLE else None
+
+    # directions returns the actions of a cheapest path from initial<tuple>
+    # to goal<tuple>, or None if there is none
+    def directions(self, initial, goal):
+        return descendField(self.problem, self.field(goal), initial)
+
+
+# Returns the problem's DistanceFieldCache, creating it on first use
+def distanceCache(problem, budget=DEFAULT_BUDGET):
+    if problem.distanceCache is None:
+        problem.distanceCache = DistanceFieldCache(problem, budget)
+    return problem.distanceCache
+
+
+class DistanceFieldTests(unittest.TestCase):
+    maze = ["XXXXXXX",
+            "X.....X",
+            "X.M.M.X",
+            "X.X.X.X",
+            "XXXXXXX"]
+
+    def test_field(self):
+        problem = MazeProblem(self.maze)
+        field = distanceField(problem, (5, 3))
+        self.assertEqual(field[problem.cellId((5, 3))], 0)
+        self.assertEqual(field[problem.cellId((1, 3))], 8)
+        self.assertEqual(field[problem.cellId((3, 3))], 6)
+        self.assertEqual(field[problem.cellId((0, 0))], UNREACHABLE)
+
+    def test_directions(self):
+        problem = MazeProblem(self.maze)
+        cache = distanceCache(problem)
+        soln = cache.directions((1, 3), (5, 3))
+        self.assertEqual(problem.soln_test(soln, (1, 3), [(5, 3)]), (8, True))
+        self.assertEqual(cache.directions((5, 3), (5, 3)), [])
+        self.assertEqual(cache.distance((5, 3), (1, 3)), 8)
+
+    def test_unreachable(self):
+        problem = MazeProblem(["XXXXXXX",
+                               "X.....X",
+                               "X.M.XXX",
+                               "X...X.X",
+                               "XXXXXXX"])
+        cache = distanceCache(problem)
+        self.assertTrue(cache.directions((1, 1), (5, 3)) is None)
+        self.assertTrue(cache.distance((1, 1), (5, 3)) is None)
+
+    def test_eviction(self):
+        problem = MazeProblem(self.maze)
+        fieldSize = 8 * len(problem.grid)
+        cache = DistanceFieldCache(problem, budget=2 * fieldSize)
+        cache.field((1, 3))
+        cache.field((3, 3))
+        cache.field((1, 3))
+        cache.field((5, 3))
+        self.assertEqual(list(cache.fields), [(1, 3), (5, 3)])
+        self.assertEqual(cache.used, 2 * fieldSize)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        self.assertTrue(cache.cached((3, 3)) is None)
+        self.assertTrue(cache.cached((5, 3)) is cache.field((5, 3)))
+        self.assertEqual((cache.hits, cache.misses), (3, 3))
+
+    def test_invalidation(self):
+        problem = MazeProblem(list(self.maze))
+        cache = distanceCache(problem)
+        self.assertEqual(cache.distance((1, 3), (5, 3)), 8)
+        problem.maze[1] = "X.MMM.X"
+        problem.compile()
+        self.assertEqual(cache.distance((1, 3), (5, 3)), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
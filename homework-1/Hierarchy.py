@@ -0,0 +1,280 @@
+'''
+Hierarchical pathfinding (HPA*) over a compiled MazeProblem, for large
+mazes in which a flat A* would expand millions of cells.
+
+=== Clusters ===
+The grid is partitioned into square clusters of clusterSize x clusterSize
+cells. Wherever open cells face each other across a cluster border, the run
+of such pairs forms an entrance; each entrance contributes one pair of
+transition cells (two pairs when it is at least entranceWidth long), joined
+by an inter-cluster edge in each direction.
+
+=== Abstract graph ===
+Transition cells of the same cluster are joined by intra-cluster edges
+whose cost is that of the cheapest path between them inside the cluster,
+mud included. A query inserts the initial and goal states into the graph,
+searches the abstract graph with A*, and only then refines the abstract
+path into actions, one cluster at a time.
+
+With exact=True every facing pair becomes a transition and the abstract
+graph preserves true maze distances, so refined paths are optimal; by
+default paths are near-optimal, as in HPA*.
+'''
+import unittest
+import random
+from array import array
+from heapq import heappush, heappop
+from MazeProblem import MazeProblem
+from Pathfinder import createPath, getDirectionsToGoal, pathCost
+
+
+class HierarchicalMap:
+
+    def __init__(self, problem, clusterSize=16, entranceWidth=6, exact=False):
+        self.problem = problem
+        self.clusterSize = clusterSize
+        self.entranceWidth = entranceWidth
+        self.exact = exact
+        self.build()
+
+    # build partitions the problem into clusters and precomputes the
+    # abstract graph; it is rerun automatically when the problem is recompiled
+    def build(self):
+        problem = self.problem
+        width = problem.width
+        height = problem.height
+        size = self.clusterSize
+        across = (width + size - 1) // size
+
+        cluster = array("i", [0]) * len(problem.grid)
+        for y in range(height):
+            base = (y // size) * across
+            for x in range(width):
+                cluster[y * width + x] = base + x // size
+        self.cluster = cluster
+
+        # edges maps each transition cell to a list of (cell, cost) pairs
+        self.edges = {}
+        self.transitions = {}
+        for x0 in range(size, width, size):
+            self.addEntrances([(y * width + x0 - 1, y * width + x0)
+                               for y in range(height)])
+        for y0 in range(size, height, size):
+            self.addEntrances([((y0 - 1) * width + x, y0 * width + x)
+                               for x in range(width)])
+
+        for members in self.transitions.values():
+            for a in members:
+                costs, _ = self.localSearch(a, cluster[a])
+                for b in members:
+                    if b != a and b in costs:
+                        self.edges[a].append((b, costs[b]))
+        self.version = problem.version
+
+    # addEntrances scans the facing cell pairs<list> along one cluster border
+    # and places transitions on each maximal run of open pairs
+    def addEntrances(self, pairs):
+        grid = self.problem.grid
+        cluster = self.cluster
+        run = []
+        for pair in pairs + [(None, None)]:
+            a, b = pair
+            if run and (a is None or not grid[a] or not grid[b]
+                        or cluster[a] != cluster[run[-1][0]]):
+                if self.exact:
+                    chosen = run
+                elif len(run) >= self.entranceWidth:
+                    chosen = [run[0], run[-1]]
+                else:
+                    chosen = [run[len(run) // 2]]
+                for c, d in chosen:
+                    self.link(c, d)
+                    self.link(d, c)
+                run = []
+            if a is not None and grid[a] and grid[b]:
+                run.append(pair)
+
+    # link adds the inter-cluster edge from transition a to its neighbor b
+    def link(self, a, b):
+        if a not in self.edges:
+            self.edges[a] = []
+            self.transitions.setdefault(self.cluster[a], []).append(a)
+        self.edges[a].append((b, self.problem.grid[b]))
+
+    # localSearch runs Dijkstra from source<int> over the cells of the given
+    # cluster, stopping early at target if one is given. Returns the dicts of
+    # costs and entering slots; with reverse=True the costs are those of
+    # reaching source instead, and no slots are recorded
+    def localSearch(self, source, clusterId, target=None, reverse=False):
+        problem = self.problem
+        grid = problem.grid
+        degree = problem.degree
+        nbrCell = problem.nbrCell
+        nbrCost = problem.nbrCost
+        cluster = self.cluster
+        costs = {source: 0}
+        parents = {source: -1}
+        frontier = [(0, source)]
+        while frontier:
+            d, cell = heappop(frontier)
+            if d > costs[cell]:
+                continue
+            if cell == target:
+                break
+            slot = cell << 2
+            for k in range(slot, slot + degree[cell]):
+                n = nbrCell[k]
+                if cluster[n] != clusterId:
+                    continue
+                nd = d + (grid[cell] if reverse else nbrCost[k])
+                if nd < costs.get(n, nd + 1):
+                    costs[n] = nd
+                    if not reverse:
+                        parents[n] = k
+                    heappush(frontier, (nd, n))
+        return costs, parents
+
+    # abstractPath returns the list of cells of the cheapest path through
+    # the abstract graph from initial<tuple> to goal<tuple>, or None
+    def abstractPath(self, initial, goal):
+        problem = self.problem
+        if problem.version != self.version:
+            self.build()
+        if not problem.reachable(initial, goal):
+            return None
+
+        width = problem.width
+        cluster = self.cluster
+        start = problem.cellId(initial)
+        target = problem.cellId(goal)
+        if start == target:
+            return [start]
+
+        # Insert the initial and goal states with edges to the transitions
+        # of their own clusters
+        startCosts, _ = self.localSearch(start, cluster[start])
+        startEdges = [(t, startCosts[t]) for t in self.transitions.get(cluster[start], ())
+                      if t in startCosts]
+        if target in startCosts:
+            startEdges.append((target, startCosts[target]))
+        goalCosts, _ = self.localSearch(target, cluster[target], reverse=True)
+        toGoal = {t: goalCosts[t] for t in self.transitions.get(cluster[target], ())
+                  if t in goalCosts}
+
+        gx, gy = goal
+        best = {start: 0}
+        parents = {start: None}
+        closed = set()
+        count = 0
+        frontier = [(0, 0, 0, start)]
+        while frontier:
+            _, _, _, node = heappop(frontier)
+            if node in closed:
+                continue
+            if node == target:
+                result = []
+                while node is not None:
+                    result.append(node)
+                    node = parents[node]
+                result.reverse()
+                return result
+            closed.add(node)
+
+            g = best[node]
+            successors = list(self.edges.get(node, ()))
+            if node == start:
+                successors.extend(startEdges)
+            if node in toGoal:
+                successors.append((target, toGoal[node]))
+            for n, cost in successors:
+                ng = g + cost
+                if ng < best.get(n, ng + 1) and n not in closed:
+                    best[n] = ng
+                    parents[n] = node
+                    h = abs(n % width - gx) + abs(n // width - gy)
+                    count += 1
+                    heappush(frontier, (ng + h, h, count, n))
+        return None
+
+    # refine lazily turns an abstract path<list> into actions, yielding the
+    # list of actions of one abstract edge at a time
+    def refine(self, nodes):
+        problem = self.problem
+        cluster = self.cluster
+        for a, b in zip(nodes, nodes[1:]):
+            if cluster[a] != cluster[b]:
+                slot = a << 2
+                for k in range(slot, slot + problem.degree[a]):
+                    if problem.nbrCell[k] == b:
+                        yield [MazeProblem.actions[problem.nbrAction[k]]]
+                        break
+            else:
+                _, parents = self.localSearch(a, cluster[a], target=b)
+                yield createPath(problem, parents, b)
+
+    # directions returns the list of actions of the refined path from
+    # initial<tuple> to goal<tuple>, or None if the goal is unreachable; it
+    # lets a HierarchicalMap serve as the backend of getDirectionsToGoal
+    def directions(self, initial, goal):
+        nodes = self.abstractPath(initial, goal)
+        if nodes is None:
+            return None
+        result = []
+        for leg in self.refine(nodes):
+            result.extend(leg)
+        return result
+
+
+class HierarchicalMapTests(unittest.TestCase):
+    maze = ["XXXXXXXXXXXX",
+            "X....X.....X",
+            "X.MM.X.XXX.X",
+            "X..M...X...X",
+            "XXX.XXXX.X.X",
+            "X...M......X",
+            "X.XXXXX.XX.X",
+            "X......M...X",
+            "XXXXXXXXXXXX"]
+
+    def test_directions(self):
+        problem = MazeProblem(self.maze)
+        hierarchy = HierarchicalMap(problem, clusterSize=4)
+        for initial, goal in [((1, 1), (10, 7)), ((10, 1), (1, 7)), ((6, 1), (6, 3))]:
+            soln = getDirectionsToGoal(problem, initial, goal, backend=hierarchy)
+            (soln_cost, is_soln) = problem.soln_test(soln, initial, [goal])
+            self.assertTrue(is_soln)
+            self.assertTrue(soln_cost >= pathCost(
+                problem, initial, getDirectionsToGoal(problem, initial, goal)))
+
+    def test_unreachable(self):
+        problem = MazeProblem(["XXXXXXX",
+                               "X.....X",
+                               "X.M.XXX",
+                               "X...X.X",
+                               "XXXXXXX"])
+        hierarchy = HierarchicalMap(problem, clusterSize=2)
+        self.assertTrue(hierarchy.directions((1, 1), (5, 3)) is None)
+        self.assertEqual(hierarchy.directions((1, 1), (1, 1)), [])
+
+    def test_exact(self):
+        rng = random.Random(485)
+        for _ in range(30):
+            width, height = rng.randint(6, 20), rng.randint(6, 20)
+            maze = ["X" * width] + ["X" + "".join(rng.choice("...MX") for _ in range(width - 2))
+                                    + "X" for _ in range(height - 2)] + ["X" * width]
+            problem = MazeProblem(maze)
+            hierarchy = HierarchicalMap(problem, clusterSize=rng.randint(2, 5), exact=True)
+            cells = [(x, y) for y in range(height) for x in range(width) if maze[y][x] != "X"]
+            for _ in range(5):
+                initial, goal = rng.choice(cells), rng.choice(cells)
+                flat = getDirectionsToGoal(problem, initial, goal)
+                soln = hierarchy.directions(initial, goal)
+                if flat is None:
+                    self.assertTrue(soln is None)
+                    continue
+                self.assertEqual(problem.soln_test(soln, initial, [goal])[0],
+                                 pathCost(problem, initial, flat))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+'''
+Jump Point Search for the homework-1 mazes, for large open areas of clear
+(cost 1) cells in which plain A* expands every cell.
+
+=== Canonical paths ===
+Among equally cheap paths through clear cells, JPS only follows canonical
+ones: vertical moves may turn left or right at any cell, while horizontal
+moves keep going straight unless a vertical neighbor is forced, i.e. only
+reachable that cheaply through the current cell because the cell beside the
+previous one is blocked. Every other path is a symmetric copy of a
+canonical one, so its cells need never be expanded.
+
+=== Jumps ===
+Rather than expanding each cell of a straight run, a search jumps along it
+and only stops at jump points: the goal, cells with a forced neighbor, and
+(for vertical runs) cells from which a horizontal jump would stop. Runs end
+without a jump point at walls.
+
+=== Mud and cost boundaries ===
+Jumping only crosses clear cells. A clear cell next to any cell of another
+cost is always a jump point and is expanded normally in all four
+directions, as are mud cells, so the search falls back to plain A* around
+cost boundaries and stays optimal.
+'''
+import unittest
+import random
+from heapq import heappush, heappop
+from MazeProblem import MazeProblem
+from Pathfinder import getDirectionsToGoal, pathCost
+
+# (dx, dy) of each action, indexed like MazeProblem.actions ("UDLR")
+DELTAS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+# Arrival direction of the initial state and of normally expanded cells
+ANY = 4
+
+
+# A* over jump points from the initial state<tuple> to the single goal<tuple>,
+# returning the list of actions of a cheapest path, or None if the goal is
+# unreachable; a drop-in alternative to getDirectionsToGoal. Search states
+# are (cell, arrival direction) pairs, since the directions a jump point is
+# expanded in depend on how it was reached
+def getDirectionsJPS(problem, initial, goal):
+    if not problem.reachable(initial, goal):
+        return None
+    grid = problem.grid
+    width = problem.width
+    height = problem.height
+    target = problem.cellId(goal)
+    gx, gy = goal
+
+    def clear(x, y):
+        return 0 <= x < width and 0 <= y < height and grid[y * width + x] == 1
+
+    # A boundary cell is a clear cell next to an open cell of another cost
+    def boundary(x, y):
+        for dx, dy in DELTAS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height and grid[ny * width + nx] > 1:
+                return True
+        return False
+
+    def forced(x, y, dx):
+        return [d for d, vy in ((0, -1), (1, 1))
+                if clear(x, y + vy) and not clear(x - dx, y + vy)]
+
+    # jump returns the (x, y, cost, steps) of the next jump point from (x, y)
+    # in direction d, or None if the run hits a wall first. Horizontal runs
+    # are probed from every cell of a vertical run, so they are memoized
+    runs = {}
+
+    def jump(x, y, d):
+        if d >= 2:
+            key = (y * width + x) * 4 + d
+            if key not in runs:
+                runs[key] = run(x, y, d)
+            return runs[key]
+        return run(x, y, d)
+
+    def run(x, y, d):
+        dx, dy = DELTAS[d]
+        nx, ny = x + dx, y + dy
+        if not (0 <= nx < width and 0 <= ny < height) or not grid[ny * width + nx]:
+            return None
+        if grid[y * width + x] != 1 or grid[ny * width + nx] != 1:
+            return (nx, ny, grid[ny * width + nx], 1)
+        steps = 1
+        while True:
+            if ny * width + nx == target or boundary(nx, ny):
+                return (nx, ny, steps, steps)
+            if dy == 0:
+                if forced(nx, ny, dx):
+                    return (nx, ny, steps, steps)
+            elif jump(nx, ny, 2) is not None or jump(nx, ny, 3) is not None:
+                return (nx, ny, steps, steps)
+            nx += dx
+            ny += dy
+            if not clear(nx, ny):
+                return None
+            steps += 1
+
+    start = problem.cellId(initial) * 5 + ANY
+    best = {start // 5: 0}
+    costs = {start: 0}
+    # parents[state] is (previous state, direction, run length)
+    parents = {start: None}
+    closed = set()
+    count = 0
+    frontier = [(0, 0, 0, start)]
+    while frontier:
+        _, _, _, state = heappop(frontier)
+        cell, arrival = divmod(state, 5)
+        if state in closed or costs[state] > best[cell]:
+            continue
+        if cell == target:
+            result = []
+            while parents[state] is not None:
+                state, d, steps = parents[state]
+                result.append(MazeProblem.actions[d] * steps)
+            result.reverse()
+            return list("".join(result))
+        closed.add(state)
+
+        x, y = cell % width, cell // width
+        if arrival == ANY or grid[cell] != 1 or boundary(x, y):
+            directions = (0, 1, 2, 3)
+        elif arrival >= 2:
+            directions = [arrival] + forced(x, y, DELTAS[arrival][0])
+        else:
+            directions = (arrival, 2, 3)
+
+        g = costs[state]
+        for d in directions:
+            point = jump(x, y, d)
+            if point is None:
+                continue
+            nx, ny, cost, steps = point
+            n = ny * width + nx
+            ng = g + cost
+            if ng > best.get(n, ng):
+                continue
+            best[n] = ng
+            # Cells of another cost, and cells next to them, are expanded
+            # in every direction however they were reached
+            nd = d if grid[n] == 1 and grid[cell] == 1 else ANY
+            successor = n * 5 + nd
+            if ng < costs.get(successor, ng + 1):
+                costs[successor] = ng
+                parents[successor] = (state, d, steps)
+                h = abs(nx - gx) + abs(ny - gy)
+                count += 1
+                heappush(frontier, (ng + h, h, count, successor))
+    return None
+
+
+class JumpPointTests(unittest.TestCase):
+
+    def test_pathfinder_mazes(self):
+        cases = [(["XXXXXXX", "X.....X", "X.M.M.X", "X.X.X.X", "XXXXXXX"], (1, 3), (5, 3), 8),
+                 (["XXXXX", "X...X", "X...X", "X.M.X", "XXXXX"], (1, 3), (3, 1), 4),
+                 (["XXXXXXX", "X....XX", "X.X.M.X", "X.M...X", "XXXXXXX"], (1, 3), (5, 3), 6),
+                 (["XXXXXXX", "X.M...X", "X.X.X.X", "X...X.X", "XXXXXXX"], (1, 1), (5, 3), 8)]
+        for maze, initial, goal, cost in cases:
+            problem = MazeProblem(maze)
+            soln = getDirectionsJPS(problem, initial, goal)
+            self.assertEqual(problem.soln_test(soln, initial, [goal]), (cost, True))
+        problem = MazeProblem(["XXXXXXX", "X.....X", "X.M.XXX", "X...X.X", "XXXXXXX"])
+        self.assertTrue(getDirectionsJPS(problem, (5, 1), (5, 3)) is None)
+
+    def test_random_against_astar(self):
+        rng = random.Random(485)
+        for _ in range(300):
+            width, height = rng.randint(3, 18), rng.randint(3, 18)
+            symbols = rng.choice(["....", "........MX", ".....X", "...MMX", "..........M"])
+            maze = ["X" * width] + ["X" + "".join(rng.choice(symbols) for _ in range(width - 2))
+                                    + "X" for _ in range(height - 2)] + ["X" * width]
+            problem = MazeProblem(maze)
+            cells = [(x, y) for y in range(height) for x in range(width) if maze[y][x] != "X"]
+            if not cells:
+                continue
+            for _ in range(3):
+                initial, goal = rng.choice(cells), rng.choice(cells)
+                expected = getDirectionsToGoal(problem, initial, goal)
+                soln = getDirectionsJPS(problem, initial, goal)
+                if expected is None:
+                    self.assertTrue(soln is None)
+                    continue
+                self.assertEqual(pathCost(problem, initial, soln),
+                                 pathCost(problem, initial, expected))
+                if soln:
+                    self.assertTrue(problem.soln_test(soln, initial, [goal])[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
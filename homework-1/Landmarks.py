@@ -0,0 +1,202 @@
+'''
+Landmark (ALT) heuristics for the homework-1 A*, for winding or mud-heavy
+mazes on which the manhattan distance badly underestimates true costs.
+
+=== Landmarks ===
+A LandmarkHeuristic picks count landmark cells by farthest-point selection
+in the largest connected region (each new landmark is the cell farthest
+from all landmarks so far; other regions fall back to manhattan) and
+stores the exact distance field towards each of them, so memory grows as
+8 bytes per cell per landmark. More landmarks give tighter estimates.
+
+=== Estimates ===
+Since moving onto a cell costs that cell's own cost, d(L, v) equals
+d(v, L) - cost(L) + cost(v), so a single field per landmark L yields both
+triangle-inequality bounds:
+  d(v, t) >= d(v, L) - d(t, L)
+  d(v, t) >= d(L, t) - d(L, v)
+Each query estimates with the `active` landmarks that bound the initial
+state's distance best, never below the manhattan distance; the estimate is
+admissible and consistent.
+'''
+import unittest
+import random
+from MazeProblem import MazeProblem
+from DistanceField import UNREACHABLE, distanceField
+from Pathfinder import getDirectionsToGoal, pathCost
+
+
+class ManhattanHeuristic:
+    # The default A* estimate, counting its evaluations for comparison
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.evaluations = 0
+
+    def forQuery(self, initial, goal):
+        width = self.problem.width
+        gx, gy = goal
+
+        def estimate(cell):
+            self.evaluations += 1
+            return abs(cell % width - gx) + abs(cell // width - gy)
+        return estimate
+
+
+class LandmarkHeuristic:
+
+    def __init__(self, problem, count=8, active=4):
+        self.problem = problem
+        self.count = count
+        self.active = active
+        self.evaluations = 0
+        self.landmarks = []
+        self.fields = []
+        self.select(count)
+        self.version = problem.version
+
+    # select adds landmarks by farthest-point selection until there are count,
+    # within the largest connected region of the maze and starting from the
+    # cell of that region farthest from its first cell
+    def select(self, count):
+        problem = self.problem
+        grid = problem.grid
+        if self.fields:
+            nearest = list(self.fields[0])
+            for field in self.fields[1:]:
+                nearest = [min(a, b) for a, b in zip(nearest, field)]
+        else:
+            sizes = [0] * problem.components
+            for label in problem.component:
+                if label >= 0:
+                    sizes[label] += 1
+            if not sizes:
+                return
+            largest = max(range(len(sizes)), key=sizes.__getitem__)
+            seed = problem.component.index(largest)
+            nearest = list(distanceField(problem, problem.cellState(seed)))
+
+        # Cells outside the region are never picked
+        nearest = [-1 if d >= UNREACHABLE else d for d in nearest]
+        while len(self.landmarks) < count:
+            landmark = max(range(len(grid)), key=nearest.__getitem__)
+            if nearest[landmark] <= 0:
+                break
+            field = distanceField(problem, problem.cellState(landmark))
+            self.landmarks.append(landmark)
+            self.fields.append(field)
+            nearest = [min(a, b) for a, b in zip(nearest, field)]
+
+    # memory returns the bytes held by the landmark distance fields
+    def memory(self):
+        return sum(field.itemsize * len(field) for field in self.fields)
+
+    # forQuery returns the estimate towards goal<tuple>; landmarks are
+    # selected afresh once the maze has changed
+    def forQuery(self, initial, goal):
+        problem = self.problem
+        if self.version != problem.version:
+            self.landmarks = []
+            self.fields = []
+            self.select(self.count)
+            self.version = problem.version
+        grid = problem.grid
+        width = problem.width
+        start = problem.cellId(initial)
+        target = problem.cellId(goal)
+        gx, gy = goal
+
+        # Keep the landmarks that reach the goal, best bound on start first
+        terms = []
+        for landmark, field in zip(self.landmarks, self.fields):
+            rt = field[target]
+            if rt >= UNREACHABLE or field[start] >= UNREACHABLE:
+                continue
+            rs = field[start]
+            bound = max(rs - rt, rt - rs + grid[target] - grid[start])
+            terms.append((bound, field, rt, rt + grid[target]))
+        terms.sort(key=lambda term: -term[0])
+        terms = [term[1:] for term in terms[:self.active]]
+
+        def estimate(cell):
+            self.evaluations += 1
+            h = abs(cell % width - gx) + abs(cell // width - gy)
+            gc = grid[cell]
+            for field, rt, ft in terms:
+                rv = field[cell]
+                if rv - rt > h:
+                    h = rv - rt
+                if ft - rv - gc > h:
+                    h = ft - rv - gc
+            return h
+        return estimate
+
+    # savings runs every (initial, goal) query<list> with both the manhattan
+    # and the landmark estimates, and reports the nodes each generated
+    def savings(self, queries):
+        manhattan = ManhattanHeuristic(self.problem)
+        before = self.evaluations
+        for initial, goal in queries:
+            getDirectionsToGoal(self.problem, initial, goal, heuristic=manhattan)
+            getDirectionsToGoal(self.problem, initial, goal, heuristic=self)
+        landmark = self.evaluations - before
+        return {"queries": len(queries),
+                "landmarks": len(self.landmarks),
+                "memory": self.memory(),
+                "manhattanNodes": manhattan.evaluations,
+                "landmarkNodes": landmark,
+                "saved": manhattan.evaluations - landmark}
+
+
+class LandmarkHeuristicTests(unittest.TestCase):
+    maze = ["XXXXXXXXXXXX",
+            "X....X.....X",
+            "X.MM.X.XXX.X",
+            "X..M.X.X...X",
+            "XXX.XX.X.X.X",
+            "X...M..X.X.X",
+            "X.XXXXXX.X.X",
+            "X......M.X.X",
+            "XXXXXXXXXXXX"]
+
+    def test_admissible(self):
+        problem = MazeProblem(self.maze)
+        heuristic = LandmarkHeuristic(problem, count=3, active=3)
+        self.assertEqual(len(heuristic.landmarks), 3)
+        for goal in [(10, 7), (1, 1), (4, 5)]:
+            field = distanceField(problem, goal)
+            estimate = heuristic.forQuery((1, 7), goal)
+            for cell, d in enumerate(field):
+                if d < UNREACHABLE:
+                    self.assertTrue(estimate(cell) <= d)
+
+    def test_optimal(self):
+        rng = random.Random(485)
+        for _ in range(30):
+            width, height = rng.randint(5, 16), rng.randint(5, 16)
+            maze = ["X" * width] + ["X" + "".join(rng.choice("..MMX") for _ in range(width - 2))
+                                    + "X" for _ in range(height - 2)] + ["X" * width]
+            problem = MazeProblem(maze)
+            heuristic = LandmarkHeuristic(problem, count=rng.randint(1, 6))
+            cells = [(x, y) for y in range(height) for x in range(width) if maze[y][x] != "X"]
+            for _ in range(5):
+                initial, goal = rng.choice(cells), rng.choice(cells)
+                flat = getDirectionsToGoal(problem, initial, goal)
+                soln = getDirectionsToGoal(problem, initial, goal, heuristic=heuristic)
+                if flat is None:
+                    self.assertTrue(soln is None)
+                else:
+                    self.assertEqual(pathCost(problem, initial, soln),
+                                     pathCost(problem, initial, flat))
+
+    def test_savings(self):
+        problem = MazeProblem(self.maze)
+        heuristic = LandmarkHeuristic(problem, count=4)
+        report = heuristic.savings([((1, 1), (10, 7)), ((10, 7), (1, 7))])
+        self.assertEqual(report["memory"], 4 * 8 * len(problem.grid))
+        self.assertTrue(report["saved"] > 0)
+        self.assertEqual(report["saved"], report["manhattanNodes"] - report["landmarkNodes"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,271 @@
+'''
+Memory-mapped maze files, for mazes far too large to hold as a list of
+Python strings. A MazeFile maps the file and reads rows only when asked
+for them, so opening one takes the same time and memory whatever its size;
+MazeProblem accepts one in place of a list of strings and compiles it on
+first use.
+
+A MazeFile only covers storing and loading the maze. Compiling it still
+builds the full neighbor tables and component labels, about 29 bytes per
+cell, in a Python loop over every cell (some 2.5 s per million cells), so
+the first search on a problem made from one costs as much time and memory
+as on a list of rows. Only with the byte format is the compiled grid not
+copied: it stays in the mapping.
+
+=== Formats ===
+  text = the maze's rows as lines of equal width, "\\n" or "\\r\\n"
+         terminated (the last line may lack its terminator)
+  byte = a 16 byte header, then one byte per cell holding the cost of
+         moving onto it (0 for walls), row by row; MazeProblem uses these
+         bytes as its compiled grid without copying them
+  2bit = the same header, then four cells per byte (lowest bits first) of
+         codes 0 = wall, 1 = clear, 2 = mud, each row padded to whole bytes
+
+The header is the magic b"MAZE", the format (1 for byte, 2 for 2bit), three
+padding bytes, and the width and height as little-endian 32 bit integers.
+The binary formats keep only the costs of the cells, so symbols other than
+walls, clear cells and mud (those of MazeProblem.costMap) read back as the
+first symbol of their cost; 2bit only holds walls, clear cells and mud.
+
+=== Changes ===
+The file is mapped copy-on-write: MazeProblem.update_cell changes the maze
+in memory, copying only the pages it writes to, and never the file itself.
+'''
+import unittest
+import mmap
+import os
+import struct
+import tempfile
+from MazeProblem import MazeProblem
+
+MAGIC = b"MAZE"
+HEADER = struct.Struct("<4sB3xII")
+ENCODINGS = {"byte": 1, "2bit": 2}
+
+# Symbols of the 2bit codes
+CODES = "X.M"
+
+# SHIFTED[s] maps a packed 2bit byte to the code of its cell s
+SHIFTED = [bytes((b >> (2 * shift)) & 3 for b in range(256)) for shift in range(4)]
+
+
+class MazeFile:
+
+    def __init__(self, path):
+        self.path = path
+        # The memoryviews of the mapping handed out by costGrid
+        self.views = []
+        with open(path, "rb") as source:
+            if os.fstat(source.fileno()).st_size == 0:
+                raise ValueError("empty maze file: %s" % path)
+            self.map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_COPY)
+        data = self.map
+
+        symbols = {}
+        for symbol in "X." + "".join(MazeProblem.costMap):
+            symbols.setdefault(MazeProblem.symbolCost(symbol), symbol)
+        if data[:4] == MAGIC:
+            _, code, self.width, self.height = HEADER.unpack_from(data)
+            self.encoding = {1: "byte", 2: "2bit"}[code]
+            self.offset = HEADER.size
+            self.stride = self.width if code == 1 else (self.width + 3) // 4
+            if code == 1:
+                # Cost byte -> symbol byte, unknown costs reading as clear
+                self.decode = bytes(ord(symbols.get(b, ".")) for b in range(256))
+            else:
+                self.decode = (CODES + ".").encode("ascii") + b"." * 252
+        else:
+            self.encoding = "text"
+            end = data.find(b"\n")
+            if end < 0:
+                end = len(data)
+            self.offset = 0
+            self.width = end - (end > 0 and data[end - 1] == ord("\r"))
+            self.stride = end + 1
+            # The last row may lack its terminator
+            self.height = (len(data) - self.width) // self.stride + 1
+        if self.encoding == "text":
+            expected = self.stride * (self.height - 1) + self.width
+        else:
+            expected = self.offset + self.stride * self.height
+        if len(data) < expected:
+            raise ValueError("maze file is shorter than its rows: %s" % path)
+
+    def __len__(self):
+        return self.height
+
+    # Row y as a string, decoded from the file on each access
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.height
+        if not 0 <= y < self.height:
+            raise IndexError("maze row out of range")
+        start = self.offset + y * self.stride
+        if self.encoding == "text":
+            return self.map[start:start + self.width].decode("latin-1")
+        if self.encoding == "byte":
+            return self.map[start:start + self.width].translate(self.decode).decode("latin-1")
+        return unpackRow(self.map[start:start + self.stride], self.width) \
+            .translate(self.decode).decode("latin-1")
+
+    # Replaces row y in the mapping (never in the file) with row<str>
+    def __setitem__(self, y, row):
+        if len(row) != self.width:
+            raise ValueError("maze rows must keep their width")
+        start = self.offset + y * self.stride
+        if self.encoding == "text":
+            self.map[start:start + self.width] = row.encode("latin-1")
+        elif self.encoding == "byte":
+            self.map[start:start + self.width] = row.encode("latin-1").translate(costTable())
+        else:
+            self.map[start:start + self.stride] = packRow(encodeCodes(row))
+
+    def __iter__(self):
+        for y in range(self.height):
+            yield self[y]
+
+    # costGrid returns the costs of all cells, row by row, as a writable
+    # bytes-like object: a view of the mapping itself in the byte format,
+    # otherwise decoded one row at a time
+    def costGrid(self):
+        size = self.width * self.height
+        if self.encoding == "byte":
+            whole = memoryview(self.map)
+            view = whole[self.offset:self.offset + size]
+            self.views += [view, whole]
+            return view
+        grid = bytearray(size)
+        width = self.width
+        if self.encoding == "text":
+            table = costTable()
+            for y in range(self.height):
+                start = y * self.stride
+                grid[y * width:(y + 1) * width] = self.map[start:start + width].translate(table)
+        else:
+            table = bytes([0, 1, MazeProblem.symbolCost("M"), 1]) + bytes(252)
+            for y in range(self.height):
+                start = self.offset + y * self.stride
+                grid[y * width:(y + 1) * width] = unpackRow(
+                    self.map[start:start + self.stride], width).translate(table)
+        return grid
+
+    # close unmaps the file. A byte format grid is a view of the mapping, so
+    # it is released, and its MazeProblem can no longer be used
+    def close(self):
+        for view in self.views:
+            view.release()
+        self.views = []
+        self.map.close()
+
+
+# Unpacks a 2bit row of packed<bytes> into one code byte per cell
+def unpackRow(packed, width):
+    codes = bytearray(4 * len(packed))
+    for shift in range(4):
+        codes[shift::4] = packed.translate(SHIFTED[shift])
+    return bytes(codes[:width])
+
+
+# Packs a row of one code byte per cell into the 2bit format
+def packRow(codes):
+    codes = bytes(codes) + bytes(-len(codes) % 4)
+    return bytes(a | b << 2 | c << 4 | d << 6
+                 for a, b, c, d in zip(codes[0::4], codes[1::4], codes[2::4], codes[3::4]))
+
+
+# Returns the table translating maze symbols to their costs
+def costTable():
+    return bytes(MazeProblem.symbolCost(chr(b)) for b in range(256))
+
+
+# Encodes a row<str> as one 2bit code per cell, unpacked
+def encodeCodes(row):
+    try:
+        return bytes(CODES.index(symbol) for symbol in row)
+    except ValueError:
+        raise ValueError("the 2bit format only holds %s cells" % ", ".join(CODES))
+
+
+# Writes the maze (a list of strings, a MazeFile, or any sequence of
+# equal-width rows) to path in the given format, one row at a time
+def writeMaze(maze, path, encoding="byte"):
+    height = len(maze)
+    width = len(maze[0]) if height else 0
+    with open(path, "wb") as out:
+        if encoding == "text":
+            for row in maze:
+                out.write(row.encode("latin-1") + b"\n")
+            return
+        out.write(HEADER.pack(MAGIC, ENCODINGS[encoding], width, height))
+        table = costTable()
+        for row in maze:
+            if len(row) != width:
+                raise ValueError("maze rows must all have the same width")
+            if encoding == "byte":
+                out.write(row.encode("latin-1").translate(table))
+            else:
+                out.write(packRow(encodeCodes(row)))
+
+
+class MazeFileTests(unittest.TestCase):
+    maze = ["XXXXXXX",
+            "X.....X",
+            "X.M.M.X",
+            "X.X.X.X",
+            "XXXXXXX"]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def roundTrip(self, encoding, maze=None):
+        path = os.path.join(self.directory.name, "maze." + encoding)
+        writeMaze(maze or self.maze, path, encoding)
+        return MazeFile(path)
+
+    def test_formats(self):
+        from Pathfinder import solve
+        expected = MazeProblem(self.maze)
+        for encoding in ("text", "byte", "2bit"):
+            mazeFile = self.roundTrip(encoding)
+            self.assertEqual((mazeFile.encoding, mazeFile.width, len(mazeFile)),
+                             (encoding, 7, 5))
+            self.assertEqual(list(mazeFile), self.maze)
+            self.assertEqual(mazeFile[-2], "X.X.X.X")
+            problem = MazeProblem(mazeFile)
+            self.assertEqual(bytes(problem.grid), bytes(expected.grid))
+            self.assertEqual(problem.nbrCell, expected.nbrCell)
+            soln = solve(problem, (1, 3), [(5, 3), (3, 1)])
+            self.assertEqual(problem.soln_test(soln, (1, 3), [(5, 3), (3, 1)]),
+                             expected.soln_test(soln, (1, 3), [(5, 3), (3, 1)]))
+            mazeFile.close()
+
+    def test_update_cell(self):
+        for encoding in ("text", "byte", "2bit"):
+            mazeFile = self.roundTrip(encoding)
+            problem = MazeProblem(mazeFile)
+            problem.update_cell((3, 3), "M")
+            self.assertEqual(mazeFile[3], "X.XMX.X")
+            self.assertEqual(problem.grid[3 * 7 + 3], 3)
+            self.assertTrue(problem.reachable((1, 3), (5, 3)))
+            mazeFile.close()
+            # The file itself is left as it was
+            mazeFile = MazeFile(mazeFile.path)
+            self.assertEqual(mazeFile[3], "X.X.X.X")
+            mazeFile.close()
+
+    def test_lazy(self):
+        mazeFile = self.roundTrip("2bit", ["X" * 9] + ["X......MX"] * 5 + ["X" * 9])
+        problem = MazeProblem(mazeFile)
+        self.assertFalse("grid" in vars(problem))
+        self.assertEqual(problem.width, 9)
+        self.assertTrue("grid" in vars(problem))
+        with self.assertRaises(ValueError):
+            writeMaze(["X*X"], os.path.join(self.directory.name, "bad"), "2bit")
+        mazeFile.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -41,34 +41,253 @@ For example, if an agent is at state (1, 1), and can only move right and down
 into clear tiles (.), then the transitions for that s = (1, 1) would be:
 [("R", 1, (2, 1)), ("D", 1, (1, 2))]
 '''
+from array import array
+from collections import Counter
+from itertools import accumulate, chain
+
 class MazeProblem:
     # Static costMap for maze components and the cost to move onto them
     # Any component not listed assumed to have a cost of 1
     costMap = {"M": 3}
 
+    # Actions in the order transitions reports them; the compiled maze
+    # stores actions as indices into this string
+    actions = "UDLR"
+
+    # Attributes set by compile; a problem made from a MazeFile compiles
+    # when one of them is first read, building the full tables then (see
+    # MazeFile.py)
+    compiled = {"height", "width", "grid", "degree", "nbrCell", "nbrCost", "nbrAction",
+                "component", "components", "version"}
+
     # MazeProblem Constructor:
-    # Constructs a new pathfinding problem from a maze, described above
+    # Constructs a new pathfinding problem from a maze, described above, or
+    # from a MazeFile.MazeFile. A list of rows is copied, so update_cell
+    # never changes the caller's list; a MazeFile is used in place
     def __init__(self, maze):
-        self.maze = maze
+        self.maze = maze if hasattr(maze, "costGrid") else list(maze)
+        self.distanceCache = None
+        # The SearchArrays the single-goal searches reuse (see Pathfinder.py)
+        self.searchArrays = None
+        # listeners are called with the id of each cell update_cell changes,
+        # or with None when the whole maze is recompiled
+        self.listeners = []
+        if not hasattr(maze, "costGrid"):
+            self.compile()
+
+    def __getattr__(self, name):
+        if name not in MazeProblem.compiled or "grid" in self.__dict__:
+            raise AttributeError(name)
+        self.compile()
+        return getattr(self, name)
+
+    # compile builds the array-backed form of the maze that the searches run
+    # on; call it again after replacing self.maze. version counts changes to
+    # the compiled maze, so caches built on an older form of it can tell they
+    # are stale (see DistanceField.py). Cells are numbered
+    # id = y * width + x, and:
+    # - grid[id] is the cost of moving onto the cell, 0 for walls
+    # - the neighbors of a cell occupy slots [4 * id, 4 * id + degree[id])
+    #   of nbrCell / nbrCost / nbrAction, in U, D, L, R order
+    # - component[id] labels the connected region of open cells the cell
+    #   belongs to, -1 for walls
+    def compile(self):
+        maze = self.maze
+        if hasattr(maze, "costGrid"):
+            # A MazeFile, whose rows all have its width
+            height = maze.height
+            width = maze.width
+            size = width * height
+            grid = maze.costGrid()
+        else:
+            height = len(maze)
+            width = max((len(row) for row in maze), default=0)
+            size = width * height
+            table = bytes(MazeProblem.symbolCost(chr(b)) for b in range(256))
+            grid = bytearray(size)
+            for y, row in enumerate(maze):
+                grid[y * width:y * width + len(row)] = row.encode("latin-1").translate(table)
+        self.height = height
+        self.width = width
+
+        degree = bytearray(size)
+        nbrCell = array("i", [0]) * (4 * size)
+        nbrCost = bytearray(4 * size)
+        nbrAction = bytearray(4 * size)
+        for y in range(height):
+            base = y * width
+            for x in range(width):
+                cell = base + x
+                slot = 4 * cell
+                if y > 0 and grid[cell - width]:
+                    nbrCell[slot] = cell - width
+                    nbrCost[slot] = grid[cell - width]
+                    slot += 1
+                if y < height - 1 and grid[cell + width]:
+                    nbrCell[slot] = cell + width
+                    nbrCost[slot] = grid[cell + width]
+                    nbrAction[slot] = 1
+                    slot += 1
+                if x > 0 and grid[cell - 1]:
+                    nbrCell[slot] = cell - 1
+                    nbrCost[slot] = grid[cell - 1]
+                    nbrAction[slot] = 2
+                    slot += 1
+                if x < width - 1 and grid[cell + 1]:
+                    nbrCell[slot] = cell + 1
+                    nbrCost[slot] = grid[cell + 1]
+                    nbrAction[slot] = 3
+                    slot += 1
+                degree[cell] = slot - 4 * cell
+
+        self.grid = grid
+        self.degree = degree
+        self.nbrCell = nbrCell
+        self.nbrCost = nbrCost
+        self.nbrAction = nbrAction
+        self.labelComponents()
+        self.version = self.__dict__.get("version", 0) + 1
+        for listener in self.listeners:
+            listener(None)
+
+    # symbolCost returns the cost of moving onto a cell showing the given
+    # maze symbol, 0 for walls
+    @staticmethod
+    def symbolCost(symbol):
+        return 0 if symbol == "X" else MazeProblem.costMap.get(symbol, 1)
+
+    # linkCell refills the neighbor table slots of the given cell id from the
+    # current grid, in the same layout compile's (inlined, for speed) loop uses
+    def linkCell(self, cell):
+        grid = self.grid
+        width = self.width
+        nbrCell = self.nbrCell
+        nbrCost = self.nbrCost
+        nbrAction = self.nbrAction
+        x = cell % width
+        slot = 4 * cell
+        if cell >= width and grid[cell - width]:
+            nbrCell[slot] = cell - width
+            nbrCost[slot] = grid[cell - width]
+            nbrAction[slot] = 0
+            slot += 1
+        if cell + width < len(grid) and grid[cell + width]:
+            nbrCell[slot] = cell + width
+            nbrCost[slot] = grid[cell + width]
+            nbrAction[slot] = 1
+            slot += 1
+        if x > 0 and grid[cell - 1]:
+            nbrCell[slot] = cell - 1
+            nbrCost[slot] = grid[cell - 1]
+            nbrAction[slot] = 2
+            slot += 1
+        if x < width - 1 and grid[cell + 1]:
+            nbrCell[slot] = cell + 1
+            nbrCost[slot] = grid[cell + 1]
+            nbrAction[slot] = 3
+            slot += 1
+        self.degree[cell] = slot - 4 * cell
+
+    # labelComponents flood fills the open cells of the compiled maze,
+    # numbering each connected region from 0; components is the number of
+    # labels issued
+    def labelComponents(self):
+        self.component = array("i", [-1]) * len(self.grid)
+        self.components = 0
+        for cell, cost in enumerate(self.grid):
+            if cost and self.component[cell] < 0:
+                self.floodComponent(cell, self.components)
+                self.components += 1
+
+    # floodComponent gives the label to the open cell and to every open cell
+    # connected to it that does not carry the label already
+    def floodComponent(self, cell, label):
+        degree = self.degree
+        nbrCell = self.nbrCell
+        component = self.component
+        component[cell] = label
+        stack = [cell]
+        while stack:
+            c = stack.pop()
+            slot = c << 2
+            for k in range(slot, slot + degree[c]):
+                n = nbrCell[k]
+                if component[n] != label:
+                    component[n] = label
+                    stack.append(n)
+
+    # update_cell changes the maze symbol at pos<tuple> and patches the
+    # compiled maze in place: the neighbor slots of the cell and of the cells
+    # around it, and the labels of the regions a new or removed wall merges
+    # or splits. Listeners are then called with the cell's id
+    def update_cell(self, pos, symbol):
+        x, y = pos
+        row = self.maze[y]
+        self.maze[y] = row[:x] + symbol + row[x + 1:]
+
+        grid = self.grid
+        width = self.width
+        cell = y * width + x
+        wasOpen = grid[cell] != 0
+        grid[cell] = MazeProblem.symbolCost(symbol)
+        around = [n for n in (cell - width, cell + width, cell - 1, cell + 1)
+                  if 0 <= n < len(grid) and (n // width == y or n % width == x)]
+        for n in [cell] + around:
+            self.linkCell(n)
+
+        component = self.component
+        if grid[cell] and not wasOpen:
+            labels = [component[n] for n in around if grid[n]]
+            if labels:
+                self.floodComponent(cell, labels[0])
+            else:
+                component[cell] = self.components
+                self.components += 1
+        elif wasOpen and not grid[cell]:
+            component[cell] = -1
+            fresh = self.components
+            for n in around:
+                if grid[n] and component[n] < fresh:
+                    self.floodComponent(n, self.components)
+                    self.components += 1
+
+        self.version += 1
+        for listener in self.listeners:
+            listener(cell)
+
+    # reachable returns True if some path connects the open states a and b
+    def reachable(self, a, b):
+        width = self.width
+        ca = self.component[a[1] * width + a[0]]
+        return ca >= 0 and ca == self.component[b[1] * width + b[0]]
+
+    # cellId returns the compiled maze's integer id of the given state
+    def cellId(self, state):
+        return state[1] * self.width + state[0]
+
+    # cellState returns the (x, y) state of the given compiled cell id
+    def cellState(self, cell):
+        return (cell % self.width, cell // self.width)
 
     # transitions returns a list of tuples in the format:
     # [(action1, cost_of_action1, result(action1, s)), ...]
     # i.e. [("R", 1, (2, 1)), ("D", 1, (1, 2))]
     # corresponding to allowable actions of the given state, as well
-    # as the next state the action leads to
+    # as the next state the action leads to; this is a view on the
+    # compiled neighbor table
     def transitions(self, state):
-        s = state
-        possible = [("U", (s[0], s[1]-1)), ("D", (s[0], s[1]+1)),
-                    ("L", (s[0]-1, s[1])), ("R", (s[0]+1, s[1]))]
-        return [(s[0], self.cost(s[1]), s[1])
-                for s in possible if self.maze[s[1][1]][s[1][0]] != "X"]
+        width = self.width
+        cell = state[1] * width + state[0]
+        start = 4 * cell
+        nbrCell = self.nbrCell
+        return [(MazeProblem.actions[self.nbrAction[k]], self.nbrCost[k],
+                 (nbrCell[k] % width, nbrCell[k] // width))
+                for k in range(start, start + self.degree[cell])]
 
     # cost returns the cost of moving onto the given state, and employs
-    # the MazeProblem's costMap
+    # the MazeProblem's costMap (walls keep the nominal cost of 1)
     def cost(self, state):
-        cm = MazeProblem.costMap
-        cell = self.maze[state[1]][state[0]]
-        return cm[cell] if cell in cm else 1
+        return self.grid[state[1] * self.width + state[0]] or 1
 
     # soln_test will return a tuple of the format (cost, isSoln) where:
     # cost = the total cost of the solution,
@@ -88,3 +307,75 @@ class MazeProblem:
             if self.maze[s[1]][s[0]] == "X":
                 return (-1, False)
         return (tc, targets == [])
+
+    # soln_test_many checks many solutions at once, each either a string (or
+    # list) of "U", "D", "L", "R" actions or a bytes-like array of action
+    # codes indexing MazeProblem.actions, all from the initial state<tuple>
+    # and towards the goals<list>. Returns (costs, isSolns), an array of the
+    # costs and a bytearray of the flags soln_test gives. Like soln_test, it
+    # raises ValueError if a path enters a goal, up to the first wall it meets,
+    # more often than goals lists that goal. Each path is walked
+    # arithmetically: its cell ids are running sums of the moves' offsets, so
+    # walls and costs are read off the compiled grid without stepping
+    def soln_test_many(self, solns, initial, goals):
+        grid = self.grid
+        width = self.width
+        size = len(grid)
+        start = initial[1] * width + initial[0]
+        # The times each goal cell must be entered
+        targets = Counter(self.cellId(goal) for goal in goals)
+        codeOf = bytearray(b"\xff") * 256
+        for code, action in enumerate(MazeProblem.actions):
+            codeOf[ord(action)] = code
+        cellStep = (-width, width, -1, 1)
+        columnStep = (0, 0, -1, 1)
+        # A move off the left or right edge lands on the next row's cell id,
+        # so columns are only tracked when an edge column has open cells;
+        # otherwise the path meets a wall first
+        wraps = any(grid[y * width] or grid[y * width + width - 1] for y in range(self.height))
+
+        costs = array("q")
+        isSolns = bytearray()
+        for soln in solns:
+            if not isinstance(soln, (bytes, bytearray, array, memoryview)):
+                soln = "".join(soln).encode("latin-1").translate(codeOf)
+            if not soln:
+                costs.append(0)
+                isSolns.append(not targets)
+                continue
+            if max(soln) > 3:
+                raise ValueError("unknown action in solution")
+            cells = list(accumulate(chain((start,), map(cellStep.__getitem__, soln))))
+            del cells[0]
+            # The path is walked up to the move leaving the maze, if any, or
+            # up to and including the first wall it meets
+            end = len(cells)
+            if min(cells) < 0 or max(cells) >= size:
+                end = next(i for i, cell in enumerate(cells) if not 0 <= cell < size)
+            if wraps:
+                columns = list(accumulate(chain((initial[0],),
+                                                  map(columnStep.__getitem__, soln))))
+                del columns[0]
+                if min(columns) < 0 or max(columns) >= width:
+                    end = min(end, next(i for i, column in enumerate(columns)
+                                        if not 0 <= column < width))
+            walked = cells if end == len(cells) else cells[:end]
+            steps = bytes(map(grid.__getitem__, walked))
+            wall = steps.find(0)
+            if wall >= 0:
+                walked = walked[:wall + 1]
+
+            reached = True
+            for cell, times in targets.items():
+                entered = walked.count(cell)
+                if entered > times:
+                    raise ValueError("solution enters goal %s more than %d time(s)"
+                                     % (self.cellState(cell), times))
+                reached = reached and entered == times
+            if wall >= 0 or end < len(cells):
+                costs.append(-1)
+                isSolns.append(0)
+                continue
+            costs.append(sum(steps))
+            isSolns.append(reached)
+        return (costs, isSolns)
@@ -4,13 +4,25 @@ sequence of actions) that takes the agent from the initial state to all
 of the goals with optimal cost.
 
 This task is done in the solve method, as parameterized
-by a maze pathfinding problem, and is aided by the SearchTreeNode DS.
+by a maze pathfinding problem, and searches over the MazeProblem's
+compiled grid and neighbor tables.
 '''
 import unittest
+import json
 import itertools
-from queue import PriorityQueue
+import random
+import time
+import multiprocessing
+from heapq import heappush, heappop
 from MazeProblem import MazeProblem
-from SearchTreeNode import SearchTreeNode
+from SearchTreeNode import SearchArrays, UNREACHED
+from DistanceField import UNREACHABLE, descendField, distanceCache
+from Tour import improveOrder, nearestNeighborOrder, tourCost
+from SearchStats import SearchStats
+
+# The most goals solveTour orders exactly: Held-Karp's tables grow as
+# 2^n * n, so larger goal sets are always ordered approximately
+EXACT_GOAL_LIMIT = 15
 
 # Calculates the manhattan distance beteen the parent node<tuple> (state)
 # and the goal node<tuple> (goal)
@@ -18,78 +30,427 @@ def manhattanDist(state, goal):
     return abs(state[0] - goal[0]) + abs(state[1] - goal[1])
 
 
-def createPath(node):
+# Rebuilds the actions leading to cell<int> from a dict of slots, as
+# Hierarchy's local searches keep in place of a SearchArrays: parents maps
+# each reached cell id to the neighbor-table slot it was entered through
+# (slot >> 2 is the parent cell, nbrAction[slot] the action taken), and the
+# search's source cell to -1
+def createPath(problem, parents, cell):
+    actions = MazeProblem.actions
+    nbrAction = problem.nbrAction
     result = []
-    while node.parent:
-        result.append(node.action)
-        node = node.parent
+    slot = parents[cell]
+    while slot >= 0:
+        result.append(actions[nbrAction[slot]])
+        slot = parents[slot >> 2]
     result.reverse()
     return result
 
-def getDirectionsToGoal(problem, initial, goal):
-    # "goals" is in the form i.e. [(2, 2), (2, 1), ... ]
-    heuristicCostFromInitial = manhattanDist(initial, goal) # ONE GOAL
-    initial = SearchTreeNode(initial, None, None, 0, heuristicCostFromInitial)
-    closedList = []
-    costToNode = 0
-
-    # find the shortest path to the goal state avoiding walls implement a closed list
-    frontier = PriorityQueue()
-    frontier.put(initial)
-
-    # ('U', 1, (2,3))
-    # state, action, parent, totalCost, heuristicCost
-    while frontier:
-        parent = frontier.get()
-
-        if parent.heuristicCost == 0:
-            return createPath(parent)
-
-        closedList.append(parent.state)
-        possibleTransitions = problem.transitions(parent.state)
-
-        # if possibleTransitions:
-
-        for possibleTransition in possibleTransitions:
-            transitionStateIndex = 2
-            costToNode = parent.totalCost + \
-            problem.cost(possibleTransition[transitionStateIndex])
+# Takes the problem's reusable SearchArrays for one search, or a new one if
+# another search holds it or the maze has changed size; the search hands it
+# back with releaseSearchArrays, which resets only the cells it touched
+def takeSearchArrays(problem):
+    store = problem.searchArrays
+    problem.searchArrays = None
+    if store is None or len(store.g) != len(problem.grid):
+        store = SearchArrays(len(problem.grid), MazeProblem.actions)
+    return store
+
+
+def releaseSearchArrays(problem, store):
+    store.reset()
+    problem.searchArrays = store
+
+
+# A* from the initial state<tuple> to the single goal<tuple>, returning the
+# list of actions of a cheapest path, or None if the goal is unreachable.
+# Frontier entries are plain (f, h, count, cell) tuples on a heapq: ties on
+# f go to the deeper node, then to the earlier push. The cheapest known g,
+# parent and action of each cell are kept in the problem's SearchArrays,
+# reset after the search; stale entries are skipped when popped. An
+# alternative backend (e.g. a Hierarchy.HierarchicalMap) answers the query
+# instead through its directions method when given. A heuristic replaces the
+# manhattan distance: heuristic.forQuery(initial, goal) must return an
+# admissible, consistent estimate of the cost from a cell id to the goal.
+# The search and its time are recorded in stats, a SearchStats, if given
+def getDirectionsToGoal(problem, initial, goal, backend=None, heuristic=None, stats=None):
+    if backend is not None:
+        return backend.directions(initial, goal)
+    if not problem.reachable(initial, goal):
+        return None
+    track = stats is not None
+    if track:
+        began = time.perf_counter()
+    estimate = heuristic.forQuery(initial, goal) if heuristic is not None else None
+    start = problem.cellId(initial)
+    target = problem.cellId(goal)
+    store = takeSearchArrays(problem)
+    try:
+        result, count, expanded, peak = aStar(store, problem, start, target, estimate,
+                                              manhattanDist(initial, goal), track)
+        if track:
+            # The initial push is estimated with manhattanDist, the rest with h
+            stats.addSearch(count + 1, expanded, len(set(store.touched)), peak,
+                            count if estimate is not None else count + 1)
+            stats.addLeg(initial, goal, time.perf_counter() - began)
+    finally:
+        releaseSearchArrays(problem, store)
+    return result
 
-            if possibleTransition[transitionStateIndex] not in closedList \
-            or costToNode < parent.totalCost:
 
-                heuristicCost = manhattanDist(
-                    possibleTransition[transitionStateIndex], goal)
-                newNode = SearchTreeNode(possibleTransition[transitionStateIndex],
-                                         possibleTransition[0], parent, costToNode,
-                                         heuristicCost)
-                frontier.put(newNode)
+# The search loop of getDirectionsToGoal from cell start to cell target on
+# the store<SearchArrays>, starting from the estimate h0; returns (the list
+# of actions or None, pushes after the first, cells expanded, peak frontier
+# size, the latter only when track is set)
+def aStar(store, problem, start, target, estimate, h0, track):
+    width = problem.width
+    degree = problem.degree
+    nbrCell = problem.nbrCell
+    nbrCost = problem.nbrCost
+    nbrAction = problem.nbrAction
+    gx = target % width
+    gy = target // width
+    best = store.g
+    parents = store.parent
+    actions = store.action
+    closed = store.closed
+    touched = store.touched
+    best[start] = 0
+    touched.append(start)
+    count = 0
+    expanded = 0
+    peak = 0
+    frontier = [(h0, 0, 0, start)]
 
-    return None
+    while frontier:
+        if track and len(frontier) > peak:
+            peak = len(frontier)
+        _, _, _, cell = heappop(frontier)
+        if closed[cell]:
+            continue
+        if cell == target:
+            return (list(store.path(cell)), count, expanded, peak)
+        closed[cell] = 1
+        expanded += 1
+
+        g = best[cell]
+        slot = cell << 2
+        for k in range(slot, slot + degree[cell]):
+            n = nbrCell[k]
+            ng = g + nbrCost[k]
+            if ng < best[n] and not closed[n]:
+                best[n] = ng
+                parents[n] = cell
+                actions[n] = nbrAction[k]
+                touched.append(n)
+                if estimate is None:
+                    h = abs(n % width - gx) + abs(n // width - gy)
+                else:
+                    h = estimate(n)
+                count += 1
+                heappush(frontier, (ng + h, h, count, n))
+    return (None, count, expanded, peak)
+
+
+# Bidirectional Dijkstra from the initial state<tuple> to the single
+# goal<tuple>, a drop-in alternative to getDirectionsToGoal for long legs.
+# The forward search pays the cost of each cell it enters; the backward
+# search, stepping from a cell v back to a neighbor u, pays the cost of v,
+# since the real move is u -> v. Whenever either side reaches a cell the
+# other side has reached, mu records the best path through it; the search
+# stops once the two frontier minima together reach mu, which keeps the
+# result optimal
+def getDirectionsBidirectional(problem, initial, goal):
+    if not problem.reachable(initial, goal):
+        return None
+    start = problem.cellId(initial)
+    target = problem.cellId(goal)
+
+    store = takeSearchArrays(problem)
+    try:
+        return bidirectional(store, problem, start, target)
+    finally:
+        releaseSearchArrays(problem, store)
+
+
+# The search of getDirectionsBidirectional from cell start to cell target,
+# keeping the forward half in the store<SearchArrays>
+def bidirectional(store, problem, start, target):
+    grid = problem.grid
+    degree = problem.degree
+    nbrCell = problem.nbrCell
+    nbrCost = problem.nbrCost
+    nbrAction = problem.nbrAction
+    forward = store.g
+    parents = store.parent
+    actions = store.action
+    touched = store.touched
+    forward[start] = 0
+    touched.append(start)
+    backward = {target: 0}
+    # successors[u] is the slot of the move v -> u in the neighbor table of
+    # u's backward parent v (k >> 2 recovers v)
+    successors = {target: -1}
+    forwardFrontier = [(0, start)]
+    backwardFrontier = [(0, target)]
+    forwardClosed = set()
+    backwardClosed = set()
+    mu = 0 if start == target else float("inf")
+    meet = start
+
+    while forwardFrontier and backwardFrontier:
+        if forwardFrontier[0][0] + backwardFrontier[0][0] >= mu:
+            break
+        if forwardFrontier[0][0] <= backwardFrontier[0][0]:
+            d, cell = heappop(forwardFrontier)
+            if cell in forwardClosed:
+                continue
+            forwardClosed.add(cell)
+            slot = cell << 2
+            for k in range(slot, slot + degree[cell]):
+                n = nbrCell[k]
+                nd = d + nbrCost[k]
+                if nd < forward[n]:
+                    forward[n] = nd
+                    parents[n] = cell
+                    actions[n] = nbrAction[k]
+                    touched.append(n)
+                    heappush(forwardFrontier, (nd, n))
+                    if n in backward and nd + backward[n] < mu:
+                        mu = nd + backward[n]
+                        meet = n
+        else:
+            d, cell = heappop(backwardFrontier)
+            if cell in backwardClosed:
+                continue
+            backwardClosed.add(cell)
+            nd = d + grid[cell]
+            slot = cell << 2
+            for k in range(slot, slot + degree[cell]):
+                n = nbrCell[k]
+                if nd < backward.get(n, nd + 1):
+                    backward[n] = nd
+                    successors[n] = k
+                    heappush(backwardFrontier, (nd, n))
+                    if nd + forward[n] < mu:
+                        mu = nd + forward[n]
+                        meet = n
+
+    if mu == float("inf"):
+        return None
+
+    # Forward half up to the meeting cell, then the backward half, whose
+    # recorded moves v -> u are reversed (U <-> D, L <-> R)
+    result = list(store.path(meet))
+    cell = meet
+    while successors[cell] >= 0:
+        k = successors[cell]
+        result.append(MazeProblem.actions[nbrAction[k] ^ 1])
+        cell = k >> 2
+    return result
 
 
-def solve(problem, initial, goals):
+# Calculates the total cost of following the given path<list> of actions
+# from the initial state<tuple>, employing the problem's cost function
+def pathCost(problem, initial, path):
+    trans = {"U": (0, -1), "D": (0, 1), "L": (-1, 0), "R": (1, 0)}
+    s = initial
+    total = 0
+    for m in path:
+        s = (s[0] + trans[m][0], s[1] + trans[m][1])
+        total += problem.cost(s)
+    return total
+
+
+# Orders the goals with the Held-Karp bitmask dynamic program. costs<list>
+# is the pairwise cost matrix: costs[0][j] is the cost from the initial state
+# to goal j, and costs[i + 1][j] the cost from goal i to goal j. Returns the
+# visiting order as a list of goal indices
+def orderGoals(costs):
+    n = len(costs) - 1
+
+    # best[mask * n + j]: cheapest cost to visit the goals in mask from the
+    # initial state, ending on goal j; via[...] holds the previous goal
+    inf = float("inf")
+    full = (1 << n) - 1
+    best = [inf] * ((full + 1) * n)
+    via = [-1] * ((full + 1) * n)
+    for j in range(n):
+        best[(1 << j) * n + j] = costs[0][j]
+
+    for mask in range(1, full + 1):
+        for j in range(n):
+            current = best[mask * n + j]
+            if current == inf:
+                continue
+            row = costs[j + 1]
+            for k in range(n):
+                if mask & (1 << k):
+                    continue
+                index = (mask | (1 << k)) * n + k
+                candidate = current + row[k]
+                if candidate < best[index]:
+                    best[index] = candidate
+                    via[index] = j
+
+    last = min(range(n), key=lambda j: best[full * n + j])
+    order = []
+    mask = full
+    while last != -1:
+        order.append(last)
+        previous = via[mask * n + last]
+        mask &= ~(1 << last)
+        last = previous
+    order.reverse()
+    return order
+
+
+# Computes the pairwise cost matrix of the legs between the stops<list>
+# (the initial state, then the goals) and the goals<list>, in the format
+# orderGoals takes. Returns (costs, directions), where directions(a, b)
+# gives the actions of the leg from stop a to goal b, or None if some leg is
+# impossible. The legs into a goal are read off its distance field when the
+# problem's DistanceFieldCache already holds one, and searched with A*
+# otherwise. With useCache, missing fields are computed and cached instead,
+# which pays off only when later calls on the same maze share the goals: a
+# field costs a search of the whole maze and 8 bytes per cell. The fields
+# used are held until the tour is assembled, so the cache may evict them
+# meanwhile. Searches and legs are recorded in stats, a SearchStats, if given
+def legMatrix(problem, stops, goals, useCache=False, stats=None):
+    costs = [[0] * len(goals) for _ in stops]
+    cache = distanceCache(problem) if useCache else problem.distanceCache
+    fields = {}
+    legs = {}
+    for j, goal in enumerate(goals):
+        field = None
+        if cache is not None:
+            field = cache.field(goal, stats) if useCache else cache.cached(goal)
+        if field is None:
+            for i, start in enumerate(stops):
+                if i == j + 1:
+                    continue
+                leg = getDirectionsToGoal(problem, start, goal, stats=stats)
+                if leg is None:
+                    return None
+                legs[start, goal] = leg
+                costs[i][j] = pathCost(problem, start, leg)
+            continue
+
+        fields[goal] = field
+        for i, start in enumerate(stops):
+            if stats is not None:
+                began = time.perf_counter()
+            costs[i][j] = field[problem.cellId(start)]
+            if stats is not None:
+                stats.addLeg(start, goal, time.perf_counter() - began)
+            if costs[i][j] >= UNREACHABLE:
+                return None
+
+    def directions(start, goal):
+        if goal in fields:
+            return descendField(problem, fields[goal], start)
+        return legs[start, goal]
+    return (costs, directions)
+
+
+# Finds a tour from initial through every goal, returning (actions, cost),
+# or None if some goal lies outside the initial state's connected region.
+# The legs come from legMatrix, given useCache as there. By default the
+# cheapest tour is found exactly with orderGoals; with approximate=True, or
+# more than EXACT_GOAL_LIMIT goals, the tour is the best one
+# Tour.improveOrder reaches from a nearest-neighbor order within timeBudget
+# seconds of the leg matrix being built. Given a SearchStats as
+# stats, the call records its searches, legs, goal order and the time of
+# its "legs", "order" and "path" phases there
+def solveTour(problem, initial, goals, useCache=False, approximate=False, timeBudget=1.0,
+              stats=None):
     for goal in goals:
-        if not problem.transitions(goal):
+        if not problem.reachable(initial, goal):
             return None
 
-    possiblePaths = list(itertools.permutations(goals))
-
-    listOfPaths = []
-
-    for permutation in possiblePaths:
-        initialCopy = initial
-        listOfDirections = []
-        for goal in permutation:
-
-            listOfDirections.extend(
-                getDirectionsToGoal(problem, initialCopy, goal))
-
-            initialCopy = goal
-
-        listOfPaths.append(listOfDirections)
-
-    return min(listOfPaths)
+    # Duplicate goals would only repeat legs of cost 0
+    goals = list(dict.fromkeys(goals))
+    if not goals:
+        return ([], 0)
+    began = time.perf_counter()
+    matrix = legMatrix(problem, [initial] + goals, goals, useCache, stats)
+    if matrix is None:
+        return None
+    costs, directions = matrix
+
+    ordered = time.perf_counter()
+    if approximate or len(goals) > EXACT_GOAL_LIMIT:
+        order = improveOrder(costs, nearestNeighborOrder(costs), ordered + timeBudget)
+    else:
+        order = orderGoals(costs)
+    assembled = time.perf_counter()
+    result = list(directions(initial, goals[order[0]]))
+    for prev, goal in zip(order, order[1:]):
+        result.extend(directions(goals[prev], goals[goal]))
+
+    if stats is not None:
+        stats.addPhase("legs", ordered - began)
+        stats.addPhase("order", assembled - ordered)
+        stats.addPhase("path", time.perf_counter() - assembled)
+        stats.goalOrder = [goals[goal] for goal in order]
+    return (result, tourCost(costs, order))
+
+
+# Finds the cheapest tour from initial through every goal, or None if some
+# goal lies outside the initial state's connected region; see solveTour for
+# the options
+def solve(problem, initial, goals, useCache=False, approximate=False, timeBudget=1.0,
+          stats=None):
+    tour = solveTour(problem, initial, goals, useCache, approximate, timeBudget, stats)
+    return None if tour is None else tour[0]
+
+
+# The problem solve_many's worker processes answer queries on. It is set
+# before the pool forks, so the compiled maze is inherited by every worker
+# instead of being pickled with each task
+workerProblem = None
+
+
+def setWorkerProblem(problem):
+    global workerProblem
+    workerProblem = problem
+
+
+# Answers one (initial, goals) query<tuple> on the worker's problem,
+# returning (cost, path), or (None, None) if there is no solution
+def solveQuery(query):
+    initial, goals = query
+    tour = solveTour(workerProblem, initial, goals, useCache=True)
+    if tour is None:
+        return (None, None)
+    return (tour[1], tour[0])
+
+
+# Solves many (initial, goals) queries<list> on the same problem, returning
+# their (cost, path) results in order. With workers > 1 the queries are
+# spread over a process pool in chunks. The queries share the maze, so their
+# legs use cached distance fields (see legMatrix); each worker keeps its own
+# cache warm across the queries it answers
+def solve_many(problem, queries, workers=1, chunksize=16):
+    if workers <= 1 or len(queries) <= 1:
+        setWorkerProblem(problem)
+        try:
+            return [solveQuery(query) for query in queries]
+        finally:
+            setWorkerProblem(None)
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        setWorkerProblem(problem)
+        try:
+            with context.Pool(workers) as pool:
+                return pool.map(solveQuery, queries, chunksize)
+        finally:
+            setWorkerProblem(None)
+
+    # Without fork, each worker receives the problem once, at start up
+    with multiprocessing.Pool(workers, setWorkerProblem, (problem,)) as pool:
+        return pool.map(solveQuery, queries, chunksize)
 
 
 class PathfinderTests(unittest.TestCase):
@@ -222,6 +583,306 @@ class PathfinderTests(unittest.TestCase):
         self.assertTrue(is_soln)
         self.assertEqual(soln_cost, 6)
 
+    # These tests check that the goal ordering is the cheapest one, and
+    # that larger goal sets no longer enumerate every permutation
+
+    def test_maze10(self):
+        maze = ["XXXXXXXX",
+                "X..M...X",
+                "X.MM.X.X",
+                "X....M.X",
+                "XXXXXXXX"]
+        problem = MazeProblem(maze)
+        initial = (1, 1)
+        goals = [(6, 1), (1, 3), (4, 2), (6, 3)]
+        brute = min(
+            sum(pathCost(problem, a, getDirectionsToGoal(problem, a, b))
+                for a, b in zip((initial,) + order, order))
+            for order in itertools.permutations(goals))
+        soln = solve(problem, initial, goals)
+        (soln_cost, is_soln) = problem.soln_test(soln, initial, goals)
+        self.assertTrue(is_soln)
+        self.assertEqual(soln_cost, brute)
+
+    def test_maze11(self):
+        maze = ["XXXXXXXXXXX",
+                "X.........X",
+                "X.M.M.M.M.X",
+                "X.........X",
+                "X.M.M.M.M.X",
+                "X.........X",
+                "XXXXXXXXXXX"]
+        problem = MazeProblem(maze)
+        initial = (1, 1)
+        goals = [(9, 1), (1, 5), (9, 5), (5, 3), (3, 1),
+                 (7, 5), (3, 3), (7, 3), (5, 5)]
+        soln = solve(problem, initial, goals)
+        (soln_cost, is_soln) = problem.soln_test(soln, initial, goals)
+        self.assertTrue(is_soln)
+        self.assertEqual(soln_cost, 24)
+
+    def test_transitions(self):
+        maze = ["XXXXX",
+                "X..MX",
+                "X.X.X",
+                "XXXXX"]
+        problem = MazeProblem(maze)
+        self.assertEqual(problem.transitions((1, 1)), [("D", 1, (1, 2)), ("R", 1, (2, 1))])
+        self.assertEqual(problem.transitions((2, 1)), [("L", 1, (1, 1)), ("R", 3, (3, 1))])
+        self.assertEqual(problem.cost((3, 1)), 3)
+        self.assertEqual(problem.cellState(problem.cellId((3, 2))), (3, 2))
+
+    def test_directions_unreachable(self):
+        maze = ["XXXXXXX",
+                "X.....X",
+                "X.M.XXX",
+                "X...X.X",
+                "XXXXXXX"]
+        problem = MazeProblem(maze)
+        self.assertTrue(getDirectionsToGoal(problem, (1, 1), (5, 3)) is None)
+        self.assertEqual(getDirectionsToGoal(problem, (1, 1), (1, 1)), [])
+
+    def test_uncached(self):
+        maze = ["XXXXXXX",
+                "X.....X",
+                "X.M.MMX",
+                "X...M.X",
+                "XXXXXXX"]
+        problem = MazeProblem(maze)
+        initial = (5, 1)
+        goals = [(5, 3), (1, 3), (1, 1)]
+        soln = solve(problem, initial, goals, useCache=False)
+        (soln_cost, is_soln) = problem.soln_test(soln, initial, goals)
+        self.assertTrue(is_soln)
+        self.assertEqual(soln_cost, 12)
+        self.assertTrue(problem.distanceCache is None)
+
+    def test_single_goal_uncached(self):
+        # A one-shot query searches its leg with A* rather than computing a
+        # distance field over the whole maze
+        maze = ["XXXXXXX",
+                "X.....X",
+                "X.M.MMX",
+                "X...M.X",
+                "XXXXXXX"]
+        problem = MazeProblem(maze)
+        stats = SearchStats()
+        soln = solve(problem, (1, 1), [(5, 3)], stats=stats)
+        self.assertEqual(problem.soln_test(soln, (1, 1), [(5, 3)]), (8, True))
+        self.assertTrue(problem.distanceCache is None)
+        self.assertEqual(stats.searches, 1)
+
+        # Once a caller has cached the goal's field, later calls read it
+        cache = distanceCache(problem)
+        cache.field((5, 3))
+        stats = SearchStats()
+        self.assertEqual(solve(problem, (1, 3), [(5, 3)], stats=stats),
+                         getDirectionsToGoal(problem, (1, 3), (5, 3)))
+        self.assertEqual(stats.searches, 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_cached_eviction(self):
+        # Fields evicted while the matrix fills are not recomputed to
+        # assemble the tour
+        maze = ["XXXXXXX",
+                "X.....X",
+                "X.M.MMX",
+                "X...M.X",
+                "XXXXXXX"]
+        problem = MazeProblem(maze)
+        cache = distanceCache(problem, budget=8 * len(problem.grid))
+        goals = [(5, 3), (1, 3), (1, 1)]
+        soln = solve(problem, (5, 1), goals, useCache=True)
+        self.assertEqual(problem.soln_test(soln, (5, 1), goals), (12, True))
+        self.assertEqual((cache.hits, cache.misses), (0, 3))
+        self.assertEqual(list(cache.fields), [(1, 1)])
+
+    def test_components(self):
+        maze = ["XXXXXXX",
+                "X.....X",
+                "X.M.XXX",
+                "X...X.X",
+                "XXXXXXX"]
+        problem = MazeProblem(maze)
+        self.assertEqual(problem.components, 2)
+        self.assertTrue(problem.reachable((1, 1), (3, 3)))
+        self.assertFalse(problem.reachable((1, 1), (5, 3)))
+        self.assertFalse(problem.reachable((1, 1), (0, 0)))
+        self.assertTrue(solve(problem, (1, 1), [(3, 3), (5, 3)]) is None)
+
+    def test_solve_many(self):
+        maze = ["XXXXXXX",
+                "X.....X",
+                "X.M.XXX",
+                "X...X.X",
+                "XXXXXXX"]
+        problem = MazeProblem(maze)
+        queries = [((1, 1), [(3, 3)]), ((5, 1), [(1, 3), (1, 1)]),
+                   ((1, 3), [(5, 3)]), ((3, 1), [])] * 5
+        results = solve_many(problem, queries, workers=2, chunksize=3)
+        self.assertEqual(results, solve_many(problem, queries))
+        self.assertEqual(results[:4], [(4, ["D", "D", "R", "R"]),
+                                       (6, ["L", "L", "L", "L", "D", "D"]),
+                                       (None, None), (0, [])])
+
+    def test_soln_test_many(self):
+        rng = random.Random(485)
+        raised = 0
+        for _ in range(20):
+            width, height = rng.randint(4, 12), rng.randint(4, 12)
+            maze = ["X" * width] + ["X" + "".join(rng.choice("...MX") for _ in range(width - 2))
+                                    + "X" for _ in range(height - 2)] + ["X" * width]
+            problem = MazeProblem(maze)
+            cells = [(x, y) for y in range(height) for x in range(width) if maze[y][x] != "X"]
+            if not cells:
+                continue
+            initial = rng.choice(cells)
+            goals = rng.sample(cells, min(len(cells), 2))
+            solns = [solve(problem, initial, goals) or []]
+            solns += ["".join(rng.choice("UDLR") for _ in range(rng.randint(0, 8)))
+                      for _ in range(30)]
+            expected = []
+            for soln in solns:
+                try:
+                    expected.append(problem.soln_test(soln, initial, goals))
+                except ValueError:
+                    # soln_test fails on paths passing a goal twice, and so
+                    # does soln_test_many
+                    with self.assertRaises(ValueError):
+                        problem.soln_test_many([soln], initial, goals)
+                    raised += 1
+                    expected.append(None)
+            solns = [soln for soln, result in zip(solns, expected) if result is not None]
+            costs, isSolns = problem.soln_test_many(solns, initial, goals)
+            codes = [bytes(MazeProblem.actions.index(a) for a in soln) for soln in solns]
+            self.assertEqual(problem.soln_test_many(codes, initial, goals), (costs, isSolns))
+            self.assertEqual([result for result in expected if result is not None],
+                             [(cost, bool(isSoln)) for cost, isSoln in zip(costs, isSolns)])
+        self.assertTrue(raised > 0)
+
+        # A goal listed twice must be entered twice, and no more
+        problem = MazeProblem(["XXXXX", "X...X", "XXXXX"])
+        costs, isSolns = problem.soln_test_many(["R", "RLR", "RLRL"], (1, 1), [(2, 1), (2, 1)])
+        self.assertEqual((list(costs), list(isSolns)), ([1, 3, 4], [0, 1, 1]))
+        self.assertEqual(problem.soln_test("RLR", (1, 1), [(2, 1), (2, 1)]), (3, True))
+        with self.assertRaises(ValueError):
+            problem.soln_test_many(["RLRLR"], (1, 1), [(2, 1), (2, 1)])
+        # Entering a goal again past the first wall is never reached
+        costs, isSolns = problem.soln_test_many(["RUDD"], (1, 1), [(2, 1)])
+        self.assertEqual((list(costs), list(isSolns)), ([-1], [0]))
+        self.assertEqual(problem.soln_test("RUDD", (1, 1), [(2, 1)]), (-1, False))
+
+        # Moves off an open edge leave the maze rather than wrap around rows
+        problem = MazeProblem(["...", "..."])
+        costs, isSolns = problem.soln_test_many(["L", "RR", "D", "DRU"], (0, 0), [(2, 0)])
+        self.assertEqual((list(costs), list(isSolns)), ([-1, 2, 1, 3], [0, 1, 0, 0]))
+
+    def test_stats(self):
+        maze = ["XXXXXXX",
+                "X.....X",
+                "X.M.M.X",
+                "X.X.X.X",
+                "XXXXXXX"]
+        problem = MazeProblem(maze)
+        stats = SearchStats()
+        soln = getDirectionsToGoal(problem, (1, 3), (5, 3), stats=stats)
+        self.assertEqual(problem.soln_test(soln, (1, 3), [(5, 3)]), (8, True))
+        self.assertEqual(stats.searches, 1)
+        self.assertEqual(stats.generated - stats.duplicates, 13)
+        self.assertTrue(0 < stats.expanded < stats.generated)
+        self.assertTrue(0 < stats.peakFrontier <= stats.generated)
+        self.assertEqual(stats.heuristicEvaluations, stats.generated)
+        self.assertEqual(len(stats.legs), 1)
+
+        goals = [(5, 3), (3, 3), (1, 1)]
+        # Uncached first: once the fields are cached, every call reads them
+        for useCache in (False, True):
+            stats = SearchStats()
+            soln = solve(problem, (1, 3), goals, useCache=useCache, stats=stats)
+            self.assertEqual(solve(problem, (1, 3), goals, useCache=useCache), soln)
+            report = json.loads(stats.toJSON())
+            self.assertEqual(sorted(report["phases"]), ["legs", "order", "path"])
+            self.assertEqual(len(report["legs"]), 12 if useCache else 9)
+            self.assertEqual(report["goalOrder"], [[1, 1], [3, 3], [5, 3]])
+            self.assertTrue(report["expanded"] > 0)
+
+    def test_search_arrays(self):
+        problem = MazeProblem(["XXXXX", "X.M.X", "XXXXX"])
+        store = SearchArrays(len(problem.grid), MazeProblem.actions)
+        store.g[6] = 0
+        store.parent[7], store.action[7], store.g[7] = 6, 3, 3
+        store.parent[8], store.action[8], store.g[8] = 7, 3, 4
+        self.assertEqual(store.path(8), "RR")
+        node = store.node(8, problem.width)
+        self.assertEqual((node.state, node.action, node.totalCost), ((3, 1), "R", 4))
+        self.assertEqual((node.parent.parent.state, node.parent.parent.action), ((1, 1), None))
+        self.assertEqual(store.path(8), "".join(getDirectionsToGoal(problem, (1, 1), (3, 1))))
+        # The searches share one store per problem, left reset after each
+        reused = problem.searchArrays
+        self.assertEqual(getDirectionsBidirectional(problem, (3, 1), (1, 1)), ["L", "L"])
+        self.assertTrue(problem.searchArrays is reused)
+        self.assertEqual((reused.touched, reused.g.count(UNREACHED), reused.closed.count(0)),
+                         ([], 15, 15))
+
+    def test_bidirectional(self):
+        rng = random.Random(485)
+        for _ in range(100):
+            width, height = rng.randint(3, 14), rng.randint(3, 14)
+            maze = ["X" * width] + ["X" + "".join(rng.choice("...MX") for _ in range(width - 2))
+                                    + "X" for _ in range(height - 2)] + ["X" * width]
+            problem = MazeProblem(maze)
+            cells = [(x, y) for y in range(height) for x in range(width) if maze[y][x] != "X"]
+            if not cells:
+                continue
+            initial, goal = rng.choice(cells), rng.choice(cells)
+            expected = getDirectionsToGoal(problem, initial, goal)
+            soln = getDirectionsBidirectional(problem, initial, goal)
+            if expected is None:
+                self.assertTrue(soln is None)
+            else:
+                self.assertEqual(pathCost(problem, initial, soln),
+                                 pathCost(problem, initial, expected))
+                if soln:
+                    self.assertTrue(problem.soln_test(soln, initial, [goal])[1])
+
+    def test_approximate(self):
+        maze = ["XXXXXXXXXXXXXXXXXXXXXX",
+                "X....M.........M.....X",
+                "X.XX.M.XXXXX.X.M.XXX.X",
+                "X....M.....X.X.......X",
+                "XMMM.XXXXX.X.XXXXX.X.X",
+                "X..........M.....M.X.X",
+                "X.XXXXX.XX.X.XXX.X.X.X",
+                "X.....X....M...X.....X",
+                "XXXXXXXXXXXXXXXXXXXXXX"]
+        problem = MazeProblem(maze)
+        rng = random.Random(485)
+        cells = [(x, y) for y in range(len(maze)) for x in range(len(maze[0]))
+                 if maze[y][x] != "X"]
+        goals = rng.sample(cells, 25)
+        (soln, cost) = solveTour(problem, (1, 1), goals, approximate=True, timeBudget=5)
+        self.assertEqual(pathCost(problem, (1, 1), soln), cost)
+        # soln_test rejects paths that pass a goal twice, as long tours do
+        visited = {(1, 1)}
+        state = (1, 1)
+        for action in soln:
+            dx, dy = {"U": (0, -1), "D": (0, 1), "L": (-1, 0), "R": (1, 0)}[action]
+            state = (state[0] + dx, state[1] + dy)
+            visited.add(state)
+        self.assertTrue(set(goals) <= visited)
+
+        # Past the limit, exact mode (whose tables would take 2^25 * 25
+        # entries) falls back to the approximation
+        self.assertTrue(len(goals) > EXACT_GOAL_LIMIT)
+        (soln, cost) = solveTour(problem, (1, 1), goals, timeBudget=0)
+        self.assertEqual(pathCost(problem, (1, 1), soln), cost)
+
+        goals = goals[:8]
+        (_, exact) = solveTour(problem, (1, 1), goals)
+        (soln, cost) = solveTour(problem, (1, 1), goals, approximate=True, timeBudget=5)
+        self.assertTrue(problem.soln_test(soln, (1, 1), goals)[1])
+        self.assertTrue(exact <= cost <= 1.2 * exact)
+
 
 if __name__ == '__main__':
     unittest.main()
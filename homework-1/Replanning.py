@@ -0,0 +1,347 @@
+'''
+Incremental replanning for mazes whose cells change while agents move, in
+the manner of LPA* and D* Lite (Koenig and Likhachev).
+
+=== Replanners ===
+A Replanner searches backwards from a single goal, keeping for every cell
+its cost-to-goal estimate g and its one-step lookahead rhs. Cells whose g
+and rhs disagree sit on the frontier. When MazeProblem.update_cell changes a
+cell, only that cell and the cells around it are re-evaluated, and the next
+query re-expands just the cells whose costs were actually affected.
+
+A Replanner answers for one or more start cells. With a single start it
+orders its frontier with the manhattan distance to that start and follows
+it as the agent moves (D* Lite); with several starts it runs uninformed.
+
+=== Tours ===
+A TourReplanner keeps one Replanner per goal, each answering for the initial
+state and every goal, and repairs the multi-goal tour of Pathfinder.solve.
+'''
+import unittest
+import random
+import time
+from heapq import heappush, heappop
+from MazeProblem import MazeProblem
+from Pathfinder import EXACT_GOAL_LIMIT, getDirectionsToGoal, orderGoals, pathCost, solve
+from Tour import improveOrder, nearestNeighborOrder
+
+INF = float("inf")
+
+
+class Replanner:
+
+    def __init__(self, problem, goal, starts):
+        self.problem = problem
+        self.goal = problem.cellId(goal)
+        self.starts = [problem.cellId(start) for start in starts]
+        self.expansions = 0
+        problem.listeners.append(self.cellChanged)
+        self.reset()
+
+    # reset drops all search state, as after the maze is recompiled
+    def reset(self):
+        self.g = {}
+        self.rhs = {self.goal: 0 if self.problem.grid[self.goal] else INF}
+        self.km = 0
+        self.last = self.starts[0]
+        self.queued = {}
+        self.frontier = []
+        self.count = 0
+        self.pending = []
+        self.stale = False
+        self.updateVertex(self.goal)
+
+    # detach stops the replanner from following changes to the problem
+    def detach(self):
+        self.problem.listeners.remove(self.cellChanged)
+
+    # cellChanged is the problem listener; changes are applied lazily
+    def cellChanged(self, cell):
+        if cell is None:
+            self.stale = True
+        else:
+            self.pending.append(cell)
+
+    def heuristic(self, a, b):
+        if len(self.starts) != 1:
+            return 0
+        width = self.problem.width
+        return abs(a % width - b % width) + abs(a // width - b // width)
+
+    def key(self, cell):
+        m = min(self.g.get(cell, INF), self.rhs.get(cell, INF))
+        return (m + self.heuristic(self.starts[0], cell) + self.km, m)
+
+    # updateVertex recomputes the cell's rhs from its successors and puts it
+    # on or takes it off the frontier
+    def updateVertex(self, cell):
+        problem = self.problem
+        if cell != self.goal:
+            rhs = INF
+            if problem.grid[cell]:
+                g = self.g
+                nbrCell = problem.nbrCell
+                nbrCost = problem.nbrCost
+                slot = cell << 2
+                for k in range(slot, slot + problem.degree[cell]):
+                    candidate = nbrCost[k] + g.get(nbrCell[k], INF)
+                    if candidate < rhs:
+                        rhs = candidate
+            if rhs < INF:
+                self.rhs[cell] = rhs
+            else:
+                self.rhs.pop(cell, None)
+
+        if self.g.get(cell, INF) != self.rhs.get(cell, INF):
+            key = self.key(cell)
+            self.queued[cell] = key
+            self.count += 1
+            heappush(self.frontier, (key[0], key[1], self.count, cell))
+        else:
+            self.queued.pop(cell, None)
+
+    # computeShortestPath expands frontier cells until every start is locally
+    # consistent and no frontier key is below any start's
+    def computeShortestPath(self):
+        problem = self.problem
+        g = self.g
+        rhs = self.rhs
+        queued = self.queued
+        frontier = self.frontier
+        while frontier:
+            k1, k2, _, cell = frontier[0]
+            if queued.get(cell) != (k1, k2):
+                heappop(frontier)
+                continue
+            if all(g.get(s, INF) == rhs.get(s, INF) and (k1, k2) >= self.key(s)
+                   for s in self.starts):
+                break
+            heappop(frontier)
+
+            key = self.key(cell)
+            if (k1, k2) < key:
+                queued[cell] = key
+                self.count += 1
+                heappush(frontier, (key[0], key[1], self.count, cell))
+                continue
+
+            self.expansions += 1
+            if g.get(cell, INF) > rhs.get(cell, INF):
+                g[cell] = rhs[cell]
+                del queued[cell]
+            else:
+                g.pop(cell, None)
+                self.updateVertex(cell)
+            slot = cell << 2
+            for k in range(slot, slot + problem.degree[cell]):
+                self.updateVertex(problem.nbrCell[k])
+
+    # update applies the changes made to the problem since the last query
+    # and repairs the search
+    def update(self):
+        if self.stale:
+            self.reset()
+        problem = self.problem
+        width = problem.width
+        size = len(problem.grid)
+        pending, self.pending = self.pending, []
+        for cell in pending:
+            x = cell % width
+            if cell == self.goal:
+                self.rhs[cell] = 0 if problem.grid[cell] else INF
+            for n in (cell, cell - width, cell + width, cell - 1, cell + 1):
+                if 0 <= n < size and (n % width == x or n // width == cell // width):
+                    self.updateVertex(n)
+        self.computeShortestPath()
+
+    # move changes the start with the given index to state<tuple>
+    def move(self, state, index=0):
+        cell = self.problem.cellId(state)
+        if index == 0:
+            self.km += self.heuristic(self.last, cell)
+            self.last = cell
+        self.starts[index] = cell
+
+    # distance returns the cost of the cheapest path from the start state
+    # to the goal, or None if there is none
+    def distance(self, state):
+        self.update()
+        d = self.g.get(self.problem.cellId(state), INF)
+        return None if d == INF else d
+
+    # directions returns the actions of the cheapest path from the start
+    # state<tuple> (one of the starts) to the goal, or None if there is none
+    def directions(self, state):
+        self.update()
+        problem = self.problem
+        g = self.g
+        cell = problem.cellId(state)
+        if g.get(cell, INF) == INF:
+            return None
+
+        result = []
+        while cell != self.goal:
+            slot = cell << 2
+            best = min(range(slot, slot + problem.degree[cell]),
+                       key=lambda k: problem.nbrCost[k] + g.get(problem.nbrCell[k], INF))
+            result.append(MazeProblem.actions[problem.nbrAction[best]])
+            cell = problem.nbrCell[best]
+        return result
+
+
+class TourReplanner:
+
+    def __init__(self, problem, initial, goals, timeBudget=1.0):
+        self.problem = problem
+        self.initial = initial
+        self.timeBudget = timeBudget
+        self.goals = list(dict.fromkeys(goals))
+        stops = [initial] + self.goals
+        self.planners = [Replanner(problem, goal, stops) for goal in self.goals]
+
+    # detach stops every planner from following changes to the problem
+    def detach(self):
+        for planner in self.planners:
+            planner.detach()
+
+    # move changes the initial state of the tour to state<tuple>
+    def move(self, state):
+        self.initial = state
+        for planner in self.planners:
+            planner.move(state)
+
+    # solve returns the actions of the cheapest tour from the initial state
+    # through every goal, as Pathfinder.solve does, repairing each goal's
+    # search rather than starting over. As in Pathfinder.solveTour, more than
+    # EXACT_GOAL_LIMIT goals are ordered approximately within timeBudget
+    # seconds
+    def solve(self):
+        if not self.goals:
+            return []
+        stops = [self.initial] + self.goals
+        costs = [[0] * len(self.goals) for _ in stops]
+        for j, planner in enumerate(self.planners):
+            for i, stop in enumerate(stops):
+                costs[i][j] = planner.distance(stop)
+                if costs[i][j] is None:
+                    return None
+
+        if len(self.goals) > EXACT_GOAL_LIMIT:
+            order = improveOrder(costs, nearestNeighborOrder(costs),
+                                 time.perf_counter() + self.timeBudget)
+        else:
+            order = orderGoals(costs)
+        result = self.planners[order[0]].directions(self.initial)
+        for prev, goal in zip(order, order[1:]):
+            result.extend(self.planners[goal].directions(self.goals[prev]))
+        return result
+
+
+class ReplanningTests(unittest.TestCase):
+
+    def randomMaze(self, rng, width, height):
+        return ["X" * width] + ["X" + "".join(rng.choice("...MX") for _ in range(width - 2))
+                                + "X" for _ in range(height - 2)] + ["X" * width]
+
+    def test_update_cell(self):
+        rng = random.Random(485)
+        maze = self.randomMaze(rng, 12, 10)
+        original = list(maze)
+        problem = MazeProblem(maze)
+        for _ in range(200):
+            problem.update_cell((rng.randint(1, 10), rng.randint(1, 8)), rng.choice(".MX"))
+        # The problem changed its own copy of the rows, not the caller's
+        self.assertEqual(maze, original)
+        fresh = MazeProblem(problem.maze)
+        self.assertEqual(problem.grid, fresh.grid)
+        self.assertEqual(problem.degree, fresh.degree)
+        for cell, degree in enumerate(fresh.degree):
+            slots = slice(4 * cell, 4 * cell + degree)
+            self.assertEqual(problem.nbrCell[slots], fresh.nbrCell[slots])
+            self.assertEqual(problem.nbrCost[slots], fresh.nbrCost[slots])
+            self.assertEqual(problem.nbrAction[slots], fresh.nbrAction[slots])
+        for a in range(len(fresh.grid)):
+            for b in range(len(fresh.grid)):
+                self.assertEqual(problem.reachable(problem.cellState(a), problem.cellState(b)),
+                                 fresh.reachable(fresh.cellState(a), fresh.cellState(b)))
+
+    def test_replanner(self):
+        rng = random.Random(485)
+        for _ in range(10):
+            problem = MazeProblem(self.randomMaze(rng, 10, 9))
+            cells = [problem.cellState(c) for c, cost in enumerate(problem.grid) if cost]
+            initial, goal = rng.choice(cells), rng.choice(cells)
+            planner = Replanner(problem, goal, [initial])
+            for _ in range(15):
+                soln = planner.directions(initial)
+                fresh = MazeProblem(list(problem.maze))
+                expected = getDirectionsToGoal(fresh, initial, goal)
+                if expected is None:
+                    self.assertTrue(soln is None)
+                else:
+                    self.assertEqual(pathCost(fresh, initial, soln),
+                                     pathCost(fresh, initial, expected))
+                    if soln:
+                        # Take a step along the plan, as an agent would
+                        dx, dy = {"U": (0, -1), "D": (0, 1), "L": (-1, 0), "R": (1, 0)}[soln[0]]
+                        initial = (initial[0] + dx, initial[1] + dy)
+                        planner.move(initial)
+                cell = rng.choice(cells)
+                if cell not in (initial, goal):
+                    problem.update_cell(cell, rng.choice(".MX"))
+            planner.detach()
+
+    def test_repair_is_local(self):
+        maze = ["X" * 22] + ["X" + "." * 20 + "X" for _ in range(20)] + ["X" * 22]
+        problem = MazeProblem(maze)
+        planner = Replanner(problem, (20, 20), [(1, 1)])
+        planner.directions((1, 1))
+        before = planner.expansions
+        problem.update_cell((20, 1), "M")
+        soln = planner.directions((1, 1))
+        self.assertEqual(problem.soln_test(soln, (1, 1), [(20, 20)]), (38, True))
+        self.assertTrue(planner.expansions - before < before // 4)
+
+    def test_tour(self):
+        rng = random.Random(485)
+        problem = MazeProblem(self.randomMaze(rng, 11, 9))
+        cells = [problem.cellState(c) for c, cost in enumerate(problem.grid) if cost]
+        initial = rng.choice(cells)
+        goals = rng.sample(cells, 4)
+        tour = TourReplanner(problem, initial, goals)
+        for _ in range(10):
+            fresh = MazeProblem(list(problem.maze))
+            expected = solve(fresh, initial, goals)
+            soln = tour.solve()
+            if expected is None:
+                self.assertTrue(soln is None)
+            else:
+                self.assertEqual(fresh.soln_test(soln, initial, goals)[0],
+                                 fresh.soln_test(expected, initial, goals)[0])
+            cell = rng.choice(cells)
+            if cell != initial and cell not in goals:
+                problem.update_cell(cell, rng.choice(".MX"))
+        tour.detach()
+
+    def test_tour_many_goals(self):
+        # Past EXACT_GOAL_LIMIT goals the tour is ordered approximately
+        maze = ["X" * 22] + ["X" + "." * 20 + "X" for _ in range(10)] + ["X" * 22]
+        problem = MazeProblem(maze)
+        goals = [(x, y) for x in range(2, 20, 3) for y in (2, 5, 9)]
+        self.assertTrue(len(goals) > EXACT_GOAL_LIMIT)
+        tour = TourReplanner(problem, (1, 1), goals, timeBudget=0.2)
+        soln = tour.solve()
+        # soln_test rejects paths that pass a goal twice, as long tours do
+        visited = {(1, 1)}
+        state = (1, 1)
+        for action in soln:
+            dx, dy = {"U": (0, -1), "D": (0, 1), "L": (-1, 0), "R": (1, 0)}[action]
+            state = (state[0] + dx, state[1] + dy)
+            visited.add(state)
+        self.assertTrue(set(goals) <= visited)
+        self.assertTrue(pathCost(problem, (1, 1), soln) > 0)
+        tour.detach()
+
+
+if __name__ == '__main__':
+    unittest.main()
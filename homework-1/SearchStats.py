@@ -0,0 +1,101 @@
+'''
+SearchStats record what the searches of a solve call did, to find out why
+the call is slow. Searches take an optional stats argument and add to the
+SearchStats given; without one they only pay a check per search and per
+expansion.
+
+=== Counters ===
+Summed over every search recorded:
+  searches = the number of searches run
+  generated = nodes pushed onto a frontier, initial states included
+  expanded = nodes taken off a frontier and expanded
+  duplicates = pushes of cells already pushed earlier in the same search
+  peakFrontier = the largest frontier any one search held
+  heuristicEvaluations = calls of the heuristic estimate
+
+=== Timings ===
+legs holds one {"start", "goal", "seconds"} dict per start-to-goal leg, in
+the order they were computed, and phases the wall-clock seconds spent in
+each named phase of a solve call.
+
+=== Goal order ===
+goalOrder is the list of goal states in the order the solution visits them.
+
+=== JSON ===
+toDict gives all of the above as plain lists and dicts (states as [x, y]
+lists), and toJSON the same as a JSON string.
+'''
+import unittest
+import json
+
+
+class SearchStats:
+
+    def __init__(self):
+        self.searches = 0
+        self.generated = 0
+        self.expanded = 0
+        self.duplicates = 0
+        self.peakFrontier = 0
+        self.heuristicEvaluations = 0
+        self.legs = []
+        self.phases = {}
+        self.goalOrder = []
+
+    # addSearch records one search, which reached distinct cells
+    def addSearch(self, generated, expanded, distinct, peakFrontier, heuristicEvaluations=0):
+        self.searches += 1
+        self.generated += generated
+        self.expanded += expanded
+        self.duplicates += generated - distinct
+        self.peakFrontier = max(self.peakFrontier, peakFrontier)
+        self.heuristicEvaluations += heuristicEvaluations
+
+    # addLeg records the seconds taken by the leg from start to goal
+    def addLeg(self, start, goal, seconds):
+        self.legs.append({"start": start, "goal": goal, "seconds": seconds})
+
+    # addPhase adds seconds to the time spent in the named phase
+    def addPhase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def toDict(self):
+        return {"searches": self.searches,
+                "generated": self.generated,
+                "expanded": self.expanded,
+                "duplicates": self.duplicates,
+                "peakFrontier": self.peakFrontier,
+                "heuristicEvaluations": self.heuristicEvaluations,
+                "legs": [{"start": list(leg["start"]), "goal": list(leg["goal"]),
+                          "seconds": leg["seconds"]} for leg in self.legs],
+                "phases": dict(self.phases),
+                "goalOrder": [list(goal) for goal in self.goalOrder]}
+
+    def toJSON(self, **kwargs):
+        return json.dumps(self.toDict(), **kwargs)
+
+
+class SearchStatsTests(unittest.TestCase):
+
+    def test_counters(self):
+        stats = SearchStats()
+        stats.addSearch(10, 6, 8, 4, 9)
+        stats.addSearch(5, 5, 5, 7)
+        self.assertEqual((stats.searches, stats.generated, stats.expanded, stats.duplicates,
+                          stats.peakFrontier, stats.heuristicEvaluations), (2, 15, 11, 2, 7, 9))
+
+    def test_json(self):
+        stats = SearchStats()
+        stats.addLeg((1, 1), (3, 2), 0.25)
+        stats.addPhase("legs", 0.25)
+        stats.addPhase("legs", 0.5)
+        stats.goalOrder = [(3, 2)]
+        report = json.loads(stats.toJSON())
+        self.assertEqual(report["legs"], [{"start": [1, 1], "goal": [3, 2], "seconds": 0.25}])
+        self.assertEqual(report["phases"], {"legs": 0.75})
+        self.assertEqual(report["goalOrder"], [[3, 2]])
+        self.assertEqual(report["searches"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,9 +22,28 @@ In the notes, we refer to this value as being evaluated through g(n)
 === heuristicCost ===
 The heuristic estimate of cost to be incurred from this node to the
 optimal solution
+
+=== SearchArrays ===
+The searches themselves keep no node objects: a SearchArrays holds the
+same information for every cell of a compiled maze in parallel typed arrays
+indexed by cell id (parent id, action code, g), and rebuilds the action
+string of a path straight from them. SearchTreeNodes remain as a view of
+those arrays for debugging.
+
+A SearchArrays is reused from search to search on the same maze: a search
+lists the cells it writes to in touched, and reset restores only those, so
+a short search costs time in the cells it reaches, not in the maze's size.
 '''
+from array import array
+
+# g of the cells a search has not reached
+UNREACHED = 2**62
+
+
 # ('U', 1, (2,3))
 class SearchTreeNode:
+    __slots__ = ("state", "action", "parent", "totalCost", "heuristicCost")
+
     def __init__(self, state, action, parent, totalCost, heuristicCost):
         self.state = state
         self.action = action
@@ -35,3 +54,57 @@ class SearchTreeNode:
 
     def __lt__(self, other):
         return self.totalCost + self.heuristicCost < other.totalCost + other.heuristicCost
+
+
+class SearchArrays:
+    __slots__ = ("parent", "action", "g", "closed", "touched", "table")
+
+    # SearchArrays for a compiled maze of size cells whose action codes index
+    # into the actions<str>; parent[id] is -1 for the root and for cells not
+    # yet reached, which have g[id] == UNREACHED, and closed[id] is 1 once a
+    # search has expanded the cell. Searches append each cell whose entries
+    # they set to touched
+    def __init__(self, size, actions):
+        self.parent = array("i", [-1]) * size
+        self.action = bytearray(size)
+        self.g = array("q", [UNREACHED]) * size
+        self.closed = bytearray(size)
+        self.touched = []
+        self.table = bytes.maketrans(bytes(range(len(actions))), actions.encode("ascii"))
+
+    # reset returns the touched cells to their unreached state, ready for
+    # the next search
+    def reset(self):
+        parent = self.parent
+        g = self.g
+        closed = self.closed
+        for cell in self.touched:
+            parent[cell] = -1
+            g[cell] = UNREACHED
+            closed[cell] = 0
+        self.touched = []
+
+    # path returns the string of actions leading from the root to cell
+    def path(self, cell):
+        parent = self.parent
+        action = self.action
+        codes = bytearray()
+        while parent[cell] >= 0:
+            codes.append(action[cell])
+            cell = parent[cell]
+        codes.reverse()
+        return codes.translate(self.table).decode("ascii")
+
+    # node returns the SearchTreeNode view of cell, with the parent chain
+    # up to the root, in a maze of the given width
+    def node(self, cell, width):
+        chain = []
+        while cell >= 0:
+            chain.append(cell)
+            cell = self.parent[cell]
+        node = None
+        for cell in reversed(chain):
+            action = None if node is None else chr(self.table[self.action[cell]])
+            node = SearchTreeNode((cell % width, cell // width), action, node,
+                                  self.g[cell], 0)
+        return node
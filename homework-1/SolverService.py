@@ -0,0 +1,411 @@
+'''
+An asyncio service answering multi-goal solve queries over a Unix socket or
+a localhost TCP port, keeping compiled mazes and their distance caches warm
+between requests.
+
+=== Protocol ===
+Requests and responses are JSON objects, one per line. Every request may
+carry an "id", echoed in its response; responses on one connection may
+arrive out of order. Responses hold "ok": true, or "ok": false and an
+"error" message.
+  {"op": "load", "maze": name, "rows": [...]} or {..., "path": file}
+      compiles the maze (rows in the homework-1 format, or a MazeFile path)
+      under the name, replacing any maze of that name
+  {"op": "solve", "maze": name, "initial": [x, y], "goals": [[x, y], ...]}
+      answers {"cost": c, "path": "UDLR..."}, or null for both if some
+      goal is unreachable
+  {"op": "stats"}
+      answers the service's counters and solve latency percentiles
+
+=== Coalescing ===
+Identical solve requests (same maze, initial state and goals) arriving
+while one is being computed wait for that computation instead of starting
+their own.
+
+=== Workers ===
+With workers > 0 searches run in a process pool, so the event loop never
+blocks on them. The service runs threads, and forking a process with
+threads can deadlock, so the pool's workers start from a forkserver (or are
+spawned where there is none). The pool lives as long as the service. Each
+load of a maze gets a new version; a worker compiles its own copy of a maze
+on its first query at that version, from the rows or path sent along with
+that query only, and keeps the copy and its caches warm until the maze is
+loaded again. Mazes are only compiled in the workers then.
+With workers == 0 mazes compile on a background thread when loaded, and
+searches run on a single background thread of this process.
+
+Usage (without --serve, the module runs its tests):
+  python SolverService.py --serve --socket /tmp/solver.sock --workers 4
+  python SolverService.py --serve --port 8765
+'''
+import unittest
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from MazeProblem import MazeProblem
+from MazeFile import MazeFile
+from Pathfinder import solveTour
+
+# Solve latencies kept for the percentiles
+LATENCY_WINDOW = 10000
+
+# In a pool worker, the compiled mazes by name, each as (version, problem)
+workerProblems = {}
+
+# What answerInWorker returns when it needs the maze's source
+SOURCE_NEEDED = "source needed"
+
+
+# Answers one query on the problem, returning (cost, path string), or
+# (None, None) if there is no solution. Queries on a loaded maze mostly share
+# their goals, so the legs use the maze's cached distance fields
+def answer(problem, initial, goals):
+    tour = solveTour(problem, initial, goals, useCache=True)
+    if tour is None:
+        return (None, None)
+    return (tour[1], "".join(tour[0]))
+
+
+# Answers one query in a pool worker, on its copy of the named maze at the
+# given version. A copy missing or out of date is compiled from source, the
+# (rows, path) the maze was loaded from, or SOURCE_NEEDED is returned when
+# the query came without it. A query from before a newer load is answered
+# on a copy it does not keep
+def answerInWorker(name, version, initial, goals, source=None):
+    held = workerProblems.get(name)
+    if held is None or held[0] != version:
+        if source is None:
+            return SOURCE_NEEDED
+        problem = compileMaze(*source)
+        if held is not None and held[0] > version:
+            return answer(problem, initial, goals)
+        held = workerProblems[name] = (version, problem)
+    return answer(held[1], initial, goals)
+
+
+# Compiles a problem from the maze rows<list>, or from the MazeFile at path
+def compileMaze(rows=None, path=None):
+    problem = MazeProblem(MazeFile(path) if path is not None else list(rows))
+    if "grid" not in vars(problem):
+        problem.compile()
+    return problem
+
+
+# Returns the given percentile of the sorted list of samples
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class SolverService:
+
+    def __init__(self, workers=0):
+        self.workers = workers
+        # The compiled mazes, by name, when searches run in this process
+        self.problems = {}
+        # The (version, (rows, path)) each maze was loaded from, by name
+        self.sources = {}
+        # Bumped on every load, so queries on a replaced maze never coalesce
+        self.generation = 0
+        self.inflight = {}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.computed = 0
+        self.coalesced = 0
+        # Queries sent to a worker again with their maze's source
+        self.resent = 0
+        self.executor = None
+        self.server = None
+
+    # executorFor returns the executor searches run on, starting it on first
+    # use
+    def executorFor(self):
+        if self.executor is None:
+            if self.workers <= 0:
+                self.executor = ThreadPoolExecutor(1)
+            else:
+                methods = multiprocessing.get_all_start_methods()
+                method = "forkserver" if "forkserver" in methods else "spawn"
+                self.executor = ProcessPoolExecutor(self.workers,
+                                                    multiprocessing.get_context(method))
+        return self.executor
+
+    # load serves the maze given by rows<list> or a MazeFile path under the
+    # name. Without workers it is compiled here, on a background thread;
+    # with them, each worker compiles it on its first query on the maze
+    async def load(self, name, rows=None, path=None):
+        source = (None if rows is None else list(rows), path)
+        if self.workers <= 0:
+            loop = asyncio.get_running_loop()
+            self.problems[name] = await loop.run_in_executor(None, compileMaze, *source)
+        self.generation += 1
+        self.sources[name] = (self.generation, source)
+
+    # compute answers the query on the named maze in the pool, sending it
+    # again with the maze's source<tuple> if the worker lacks that version
+    async def compute(self, name, version, source, initial, goals):
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.executorFor(), answerInWorker,
+                                            name, version, initial, goals)
+        if result == SOURCE_NEEDED:
+            self.resent += 1
+            result = await loop.run_in_executor(self.executorFor(), answerInWorker,
+                                                name, version, initial, goals, source)
+        return result
+
+    # solve answers the query, sharing the computation of any identical query
+    # still in flight. Every caller awaits the computation through a shield,
+    # so a cancelled caller never cancels it for the others
+    async def solve(self, name, initial, goals):
+        if name not in self.sources:
+            raise KeyError("no maze named %r" % name)
+        version, source = self.sources[name]
+        key = (version, name, initial, tuple(goals))
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            if self.workers > 0:
+                future = asyncio.ensure_future(self.compute(name, version, source,
+                                                            initial, goals))
+            else:
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(self.executorFor(), answer,
+                                              self.problems[name], initial, goals)
+            self.inflight[key] = future
+            future.add_done_callback(lambda _: self.inflight.pop(key, None))
+            self.computed += 1
+        return await asyncio.shield(future)
+
+    def stats(self):
+        samples = sorted(self.latencies)
+        return {"requests": self.requests,
+                "computed": self.computed,
+                "coalesced": self.coalesced,
+                "resent": self.resent,
+                "mazes": sorted(self.sources),
+                "latency": {"count": len(samples),
+                            "p50": percentile(samples, 0.5),
+                            "p90": percentile(samples, 0.9),
+                            "p99": percentile(samples, 0.99),
+                            "max": samples[-1] if samples else None}}
+
+    # respond answers one request<dict>
+    async def respond(self, request):
+        self.requests += 1
+        op = request.get("op")
+        if op == "solve":
+            began = time.perf_counter()
+            cost, path = await self.solve(request["maze"], tuple(request["initial"]),
+                                          [tuple(goal) for goal in request["goals"]])
+            self.latencies.append(time.perf_counter() - began)
+            return {"cost": cost, "path": path}
+        if op == "load":
+            await self.load(request["maze"], request.get("rows"), request.get("path"))
+            return {}
+        if op == "stats":
+            return self.stats()
+        raise ValueError("unknown op %r" % op)
+
+    async def handleRequest(self, line, writer, lock):
+        request = None
+        try:
+            request = json.loads(line)
+            response = {"id": request.get("id")}
+            response.update(await self.respond(request))
+            response["ok"] = True
+        except Exception as error:
+            response = {"id": request.get("id") if isinstance(request, dict) else None,
+                        "ok": False, "error": "%s: %s" % (type(error).__name__, error)}
+        async with lock:
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    # handleConnection serves the requests of one client, concurrently
+    async def handleConnection(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self.handleRequest(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+
+    # start listens on the Unix socket at socketPath if given, otherwise on
+    # host:port (port 0 picks a free one, see address)
+    async def start(self, socketPath=None, host="127.0.0.1", port=0):
+        if socketPath is not None:
+            self.server = await asyncio.start_unix_server(self.handleConnection, socketPath)
+        else:
+            self.server = await asyncio.start_server(self.handleConnection, host, port)
+
+    def address(self):
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+# Runs the service until interrupted, with the command line arguments argv
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serves homework-1 solve queries.")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    asyncio.run(serve(parser.parse_args(argv)))
+
+
+async def serve(args):
+    service = SolverService(args.workers)
+    await service.start(args.socket, args.host, args.port)
+    print("listening on %s" % (service.address(),))
+    try:
+        await service.server.serve_forever()
+    finally:
+        await service.close()
+
+
+class SolverServiceTests(unittest.TestCase):
+    maze = ["XXXXXXXXXX",
+            "X....M...X",
+            "X.XX.M.X.X",
+            "X..X...X.X",
+            "XX.XXX.X.X",
+            "X........X",
+            "XXXXXXXXXX"]
+
+    async def session(self, workers, socketPath=None):
+        service = SolverService(workers)
+        await service.start(socketPath)
+        try:
+            if socketPath is not None:
+                reader, writer = await asyncio.open_unix_connection(socketPath)
+            else:
+                reader, writer = await asyncio.open_connection(*service.address()[:2])
+            requests = [{"id": 0, "op": "load", "maze": "m", "rows": self.maze}]
+            for i in range(1, 9):
+                requests.append({"id": i, "op": "solve", "maze": "m", "initial": [1, 1],
+                                 "goals": [[8, 5], [1, 3], [6, 1]]})
+            requests.append({"id": 9, "op": "solve", "maze": "nope", "initial": [1, 1],
+                             "goals": []})
+            writer.write((json.dumps(requests[0]) + "\n").encode("utf-8"))
+            await writer.drain()
+            responses = [json.loads(await reader.readline())]
+            writer.write("".join(json.dumps(r) + "\n" for r in requests[1:]).encode("utf-8"))
+            await writer.drain()
+            for _ in requests[1:]:
+                responses.append(json.loads(await reader.readline()))
+            writer.write(b'{"id": 10, "op": "stats"}\n')
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+            writer.close()
+            return {response["id"]: response for response in responses}
+        finally:
+            await service.close()
+
+    def check(self, responses):
+        problem = MazeProblem(self.maze)
+        _, cost = solveTour(problem, (1, 1), [(8, 5), (1, 3), (6, 1)])
+        self.assertTrue(responses[0]["ok"])
+        for i in range(1, 9):
+            self.assertEqual(responses[i]["cost"], cost)
+            self.assertEqual(problem.soln_test(responses[i]["path"], (1, 1),
+                                               [(8, 5), (1, 3), (6, 1)]), (cost, True))
+        self.assertFalse(responses[9]["ok"])
+        stats = responses[10]
+        self.assertEqual(stats["computed"] + stats["coalesced"], 8)
+        self.assertEqual(stats["latency"]["count"], 8)
+        self.assertTrue(0 <= stats["latency"]["p50"] <= stats["latency"]["max"])
+
+    def test_tcp(self):
+        responses = asyncio.run(self.session(0))
+        self.check(responses)
+        # All eight arrive together, so they share one computation
+        self.assertEqual(responses[10]["computed"], 1)
+
+    def test_cancelled_caller(self):
+        goals = [(8, 5), (1, 3), (6, 1)]
+
+        async def session():
+            service = SolverService(0)
+            await service.load("m", self.maze)
+            # Hold the search thread until both callers are waiting
+            release = threading.Event()
+            service.executorFor().submit(release.wait)
+            first = asyncio.ensure_future(service.solve("m", (1, 1), goals))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(service.solve("m", (1, 1), goals))
+            await asyncio.sleep(0)
+            first.cancel()
+            release.set()
+            try:
+                return (await second, service.coalesced)
+            finally:
+                await service.close()
+
+        (cost, _), coalesced = asyncio.run(session())
+        self.assertEqual(coalesced, 1)
+        self.assertEqual(cost, solveTour(MazeProblem(self.maze), (1, 1), goals)[1])
+
+    def test_reload_keeps_pool(self):
+        goals = [(8, 5), (1, 3), (6, 1)]
+        other = ["XXXXX", "X...X", "XXXXX"]
+        changed = list(self.maze)
+        changed[1] = "X....MM..X"
+
+        async def session():
+            service = SolverService(1)
+            try:
+                await service.load("m", self.maze)
+                await service.load("o", other)
+                self.assertEqual(service.problems, {})
+                await service.solve("m", (1, 1), goals)
+                await service.solve("o", (1, 1), [(3, 1)])
+                executor = service.executor
+                await service.load("m", changed)
+                results = [await service.solve("m", (1, 1), goals),
+                           await service.solve("o", (3, 1), [(1, 1)])]
+                self.assertTrue(service.executor is executor)
+                return (results, service.resent)
+            finally:
+                await service.close()
+
+        (first, second), resent = asyncio.run(session())
+        # The worker was sent each maze once, and "m" again after its reload
+        self.assertEqual(resent, 3)
+        self.assertEqual(first[0], solveTour(MazeProblem(changed), (1, 1), goals)[1])
+        self.assertNotEqual(first[0], solveTour(MazeProblem(self.maze), (1, 1), goals)[1])
+        self.assertEqual(second, (2, "LL"))
+
+    def test_unix_socket_pool(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.check(asyncio.run(self.session(2, os.path.join(directory, "solver.sock"))))
+
+
+if __name__ == '__main__':
+    if "--serve" in sys.argv[1:]:
+        main([arg for arg in sys.argv[1:] if arg != "--serve"])
+    else:
+        unittest.main()
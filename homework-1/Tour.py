@@ -0,0 +1,159 @@
+'''
+Approximate goal orderings for large goal sets, on which the exact
+Held-Karp program of Pathfinder.orderGoals is out of reach.
+
+=== Cost matrices ===
+As for orderGoals, costs[0][j] is the cost from the initial state to goal
+j, and costs[i + 1][j] the cost from goal i to goal j. Costs are asymmetric,
+since moving onto a cell costs that cell's own cost. An order is a list of
+goal indices; the tour starts at the initial state and does not return.
+
+=== Improvement ===
+improveOrder starts from a nearest-neighbor order and repeatedly applies
+improving 2-opt moves (reversing a stretch of the tour) and Or-opt moves
+(relocating a run of up to three goals, possibly reversed) until none is
+left or the time budget runs out, so it always holds a valid tour.
+'''
+import unittest
+import itertools
+import random
+import time
+
+
+# Returns the cost of visiting the goals in the given order<list>
+def tourCost(costs, order):
+    total = costs[0][order[0]] if order else 0
+    for a, b in zip(order, order[1:]):
+        total += costs[a + 1][b]
+    return total
+
+
+# Builds an order by always moving on to the cheapest unvisited goal
+def nearestNeighborOrder(costs):
+    n = len(costs) - 1
+    unvisited = set(range(n))
+    order = []
+    row = costs[0]
+    while unvisited:
+        goal = min(unvisited, key=lambda j: (row[j], j))
+        unvisited.remove(goal)
+        order.append(goal)
+        row = costs[goal + 1]
+    return order
+
+
+# Improves the order<list> in place with 2-opt and Or-opt moves until it is
+# locally optimal or time.perf_counter() passes deadline; returns it
+def improveOrder(costs, order, deadline):
+    # Nodes are 0 for the initial state and j + 1 for goal j, so that
+    # d[a][b] is the cost of the move between two tour nodes
+    d = [[0] + row for row in costs]
+    tour = [0] + [j + 1 for j in order]
+    n = len(tour)
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+
+        # 2-opt: reverse tour[i..j]. forward[k] and backward[k] are prefix
+        # sums of the tour's edges walked forwards and backwards
+        forward = [0] * n
+        backward = [0] * n
+        for k in range(1, n):
+            forward[k] = forward[k - 1] + d[tour[k - 1]][tour[k]]
+            backward[k] = backward[k - 1] + d[tour[k]][tour[k - 1]]
+        for i in range(1, n - 1):
+            if time.perf_counter() >= deadline:
+                break
+            before = d[tour[i - 1]]
+            for j in range(i + 1, n):
+                old = before[tour[i]] + forward[j] - forward[i]
+                new = before[tour[j]] + backward[j] - backward[i]
+                if j + 1 < n:
+                    old += d[tour[j]][tour[j + 1]]
+                    new += d[tour[i]][tour[j + 1]]
+                if new < old:
+                    tour[i:j + 1] = tour[i:j + 1][::-1]
+                    improved = True
+                    break
+            if improved:
+                break
+        if improved:
+            continue
+
+        # Or-opt: move tour[i:i + length] between tour[a] and tour[a + 1]
+        for length in (1, 2, 3):
+            for i in range(1, n - length + 1):
+                if time.perf_counter() >= deadline:
+                    break
+                segment = tour[i:i + length]
+                rest = tour[:i] + tour[i + length:]
+                p = tour[i - 1]
+                removed = d[p][segment[0]]
+                for k in range(length - 1):
+                    removed += d[segment[k]][segment[k + 1]]
+                if i + length < n:
+                    q = tour[i + length]
+                    removed += d[segment[-1]][q] - d[p][q]
+                for candidate in (segment, segment[::-1]):
+                    inner = 0
+                    for k in range(length - 1):
+                        inner += d[candidate[k]][candidate[k + 1]]
+                    for a in range(len(rest)):
+                        if a == i - 1 and candidate is segment:
+                            continue
+                        added = d[rest[a]][candidate[0]] + inner
+                        if a + 1 < len(rest):
+                            added += d[candidate[-1]][rest[a + 1]] - d[rest[a]][rest[a + 1]]
+                        if added < removed:
+                            tour[:] = rest[:a + 1] + candidate + rest[a + 1:]
+                            improved = True
+                            break
+                    if improved:
+                        break
+                if improved:
+                    break
+            if improved:
+                break
+
+    order[:] = [node - 1 for node in tour[1:]]
+    return order
+
+
+class TourTests(unittest.TestCase):
+
+    def randomCosts(self, rng, n):
+        points = [(rng.randint(0, 50), rng.randint(0, 50)) for _ in range(n + 1)]
+        return [[abs(a[0] - b[0]) + abs(a[1] - b[1]) + rng.randint(0, 3) for b in points[1:]]
+                for a in points]
+
+    def test_nearest_neighbor(self):
+        costs = [[5, 1, 9],
+                 [0, 4, 2],
+                 [3, 0, 7],
+                 [1, 6, 0]]
+        self.assertEqual(nearestNeighborOrder(costs), [1, 0, 2])
+        self.assertEqual(tourCost(costs, [1, 0, 2]), 1 + 3 + 2)
+
+    def test_improves(self):
+        rng = random.Random(485)
+        for _ in range(20):
+            n = rng.randint(2, 7)
+            costs = self.randomCosts(rng, n)
+            order = nearestNeighborOrder(costs)
+            start = tourCost(costs, order)
+            improveOrder(costs, order, time.perf_counter() + 5)
+            self.assertEqual(sorted(order), list(range(n)))
+            best = min(tourCost(costs, list(p)) for p in itertools.permutations(range(n)))
+            self.assertTrue(best <= tourCost(costs, order) <= start)
+
+    def test_deadline(self):
+        rng = random.Random(485)
+        costs = self.randomCosts(rng, 150)
+        order = nearestNeighborOrder(costs)
+        improveOrder(costs, order, time.perf_counter() - 1)
+        self.assertEqual(order, nearestNeighborOrder(costs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,27 +5,120 @@ Specifies a Propositional Logic Clause formatted specifically
 for Grid Maze Pathfinding problems. Clauses are a disjunction of
 MazePropositions (2-tuples of (symbol, location)) mapped to
 their negated status in the sentence.
+
+Each MazeProposition is interned once, as an integer id (see
+prop_id), and a clause keeps its literals as a tuple of signed
+integers sorted by proposition, so that resolution, the tautology
+check, equality and hashing work on small integers. Literals are
+DIMACS style: +(id + 1) for a positive proposition and -(id + 1)
+for a negated one.
 '''
 import unittest
 
+# The interned MazePropositions: PROP_IDS maps each to its id, and
+# PROPS lists them by id
+PROP_IDS = {}
+PROPS = []
+
+
+def prop_id(prop):
+    """
+    Returns the integer id of the given MazeProposition, interning it
+    on first use
+    """
+    i = PROP_IDS.get(prop)
+    if i is None:
+        i = PROP_IDS[prop] = len(PROPS)
+        PROPS.append(prop)
+    return i
+
+
 class MazeClause:
 
+    __slots__ = ("lits", "valid", "hash", "sig", "litset")
+
     def __init__(self, props):
         """
         Constructor parameterized by the propositions within this clause;
         argument props is a list of MazePropositions, like:
         [(("X", (1, 1)), True), (("X", (2, 1)), True), (("Y", (1, 2)), False)]
         """
-        self.props = {}
+        literals = {}
         self.valid = False
-        for prop in props:
-            if prop[0] in self.props and prop[1] != self.props.get(prop[0]):
-                self.props.clear()
+        for prop, value in props:
+            var = prop_id(prop) + 1
+            if literals.setdefault(var, value) != value:
                 self.valid = True
+                literals.clear()
                 break
-            else:
-                self.props[prop[0]] = prop[1]
+        self.lits = tuple(var if literals[var] else -var for var in sorted(literals))
+        self.hash = hash(self.lits)
+        self.sig = None
+        self.litset = None
+
+    @staticmethod
+    def from_literals(literals):
+        """
+        Returns the (non-valid) clause of the given signed literals, a
+        tuple sorted by proposition and holding each at most once
+        """
+        clause = MazeClause.__new__(MazeClause)
+        clause.lits = literals
+        clause.valid = False
+        clause.hash = hash(literals)
+        clause.sig = None
+        clause.litset = None
+        return clause
+
+    @property
+    def props(self):
+        """
+        The clause as a dict of its MazePropositions mapped to their
+        negated status, built from the literals on each access
+        """
+        return {PROPS[abs(literal) - 1]: literal > 0 for literal in self.lits}
+
+    def literals(self):
+        """
+        Returns the tuple of signed literals of this clause, ordered by id
+        """
+        return self.lits
+
+    def literal_set(self):
+        """
+        Returns the frozenset of the literals of this clause
+        """
+        if self.litset is None:
+            self.litset = frozenset(self.lits)
+        return self.litset
 
+    def signature(self):
+        """
+        Returns a 64 bit summary of the literals of this clause, with a bit
+        set for each: a clause can only subsume clauses whose signatures
+        hold all the bits of its own
+        """
+        if self.sig is None:
+            sig = 0
+            for literal in self.lits:
+                sig |= 1 << (2 * literal if literal > 0 else 1 - 2 * literal) % 64
+            self.sig = sig
+        return self.sig
+
+    def subsumes(self, other):
+        """
+        Returns True if every literal of this clause is in the other, so
+        that the other is implied by this one
+        """
+        return (len(self.lits) <= len(other.lits)
+                and not self.signature() & ~other.signature()
+                and other.literal_set().issuperset(self.lits))
+
+    def __len__(self):
+        """
+        The number of literals in this clause
+        """
+        return len(self.lits)
 
     def get_prop(self, prop):
         """
@@ -34,9 +127,14 @@ class MazeClause:
           - True if the requested prop is positive in the clause
           - False if the requested prop is negated in the clause
         """
-        if prop in self.props:
-            return self.props.get(prop)
-
+        i = PROP_IDS.get(prop)
+        if i is None:
+            return None
+        literals = self.literal_set()
+        if i + 1 in literals:
+            return True
+        if -(i + 1) in literals:
+            return False
         return None
 
 
@@ -55,26 +153,21 @@ class MazeClause:
           - False otherwise
         (NB: valid clauses are not empty)
         """
-        return not self.valid and not self.props
+        return not self.valid and not self.lits
 
     def __eq__(self, other):
         """
         Defines equality comparator between MazeClauses: only if they
         have the same props (in any order) or are both valid
         """
-        return self.props == other.props and self.valid == other.valid
+        return self.lits == other.lits and self.valid == other.valid
 
     def __hash__(self):
         """
         Provides a hash for a MazeClause to enable set membership
         """
-        # Hashes an immutable set of the stored props for ease of
-        # lookup in a set
-        return hash(frozenset(self.props.items()))
-
-    # Hint: Specify a __str__ method for ease of debugging (this
-    # will allow you to "print" a MazeClause directly to inspect
-    # its composite literals)
+        # Computed once, from the literals
+        return self.hash
 
     def __str__(self):
         return str(self.props)
@@ -89,24 +182,23 @@ class MazeClause:
         of 0 or 1 MazeClause, but it being a set is convenient for the
         inference engine)
         """
-        # TODO: This is currently implemented incorrectly; see
-        results = set()
-
-        for c1_prop in c1.props:
-            for c2_prop in c2.props:
-                if c1_prop == c2_prop and c1.props.get(c1_prop) != c2.props.get(c2_prop):
-                    union = c1.props.items() | c2.props.items()
-                    union.remove((c1_prop, c1.props.get(c1_prop)))
-                    union.remove((c2_prop, c2.props.get(c2_prop)))
-
-                    c3 = MazeClause(list(union))
-
-                    if not c3.is_valid():
-                        results.add(c3)
+        # The literal of c1 whose complement is in c2; with more than one,
+        # the resolvent would be a tautology
+        others = c2.literal_set()
+        clash = None
+        for literal in c1.lits:
+            if -literal in others:
+                if clash is not None:
+                    return set()
+                clash = literal
+        if clash is None:
+            return set()
+        literals = set(c1.lits)
+        literals.update(c2.lits)
+        literals.discard(clash)
+        literals.discard(-clash)
+        return {MazeClause.from_literals(tuple(sorted(literals, key=abs)))}
 
-                    return results
-
-        return results
 
 class MazeClauseTests(unittest.TestCase):
     def test_mazeprops1(self):
@@ -173,5 +265,26 @@ class MazeClauseTests(unittest.TestCase):
         self.assertTrue(MazeClause(
             [(("Y", (1, 1)), False), (("Z", (1, 1)), True), (("W", (1, 1)), False)]) in res)
 
+    def test_mazeprops_interned(self):
+        mc1 = MazeClause([(("Q", (7, 7)), True), (("R", (7, 7)), False)])
+        mc2 = MazeClause([(("R", (7, 7)), False), (("Q", (7, 7)), True)])
+        self.assertEqual((mc1.literals(), hash(mc1)), (mc2.literals(), hash(mc2)))
+        q, r = prop_id(("Q", (7, 7))) + 1, prop_id(("R", (7, 7))) + 1
+        self.assertEqual(mc1.literals(), tuple(sorted([q, -r], key=abs)))
+        self.assertEqual(mc1.props, {("Q", (7, 7)): True, ("R", (7, 7)): False})
+        self.assertEqual(len(mc1), 2)
+        self.assertEqual(MazeClause.from_literals(mc1.literals()), mc1)
+        self.assertTrue(MazeClause([(("Q", (7, 7)), True)]) != mc1)
+
+    def test_mazeprops_subsumes(self):
+        mc1 = MazeClause([(("X", (1, 1)), True), (("Y", (1, 1)), False)])
+        mc2 = MazeClause([(("Y", (1, 1)), False), (("X", (1, 1)), True), (("Z", (1, 1)), True)])
+        mc3 = MazeClause([(("X", (1, 1)), True), (("Y", (1, 1)), True), (("Z", (1, 1)), True)])
+        self.assertTrue(mc1.subsumes(mc2))
+        self.assertTrue(mc1.subsumes(mc1))
+        self.assertFalse(mc2.subsumes(mc1))
+        self.assertFalse(mc1.subsumes(mc3))
+        self.assertTrue(MazeClause([]).subsumes(mc3))
+
 if __name__ == "__main__":
     unittest.main()
@@ -6,14 +6,63 @@ Logic Knowledge Base for use in Grid Maze pathfinding problems
 with side-information.
 '''
 import unittest
-import copy
+import collections
+import heapq
 import itertools
-from maze_clause import MazeClause
+from maze_clause import MazeClause, prop_id
+from sat_solver import Solver
+
+ENGINES = ("auto", "resolution", "cdcl", "horn")
+
+# The counters of MazeKnowledgeBase.stats
+STATS = ("told", "tautologies", "strengthened", "forward_subsumed", "backward_subsumed",
+         "resolvents", "pure_skipped", "horn_asks")
+
 
 class MazeKnowledgeBase:
+    """
+    The KB keeps its inference state between asks, extending it on each
+    tell rather than rederiving it per query:
+      - resolution: the KB's clauses indexed by literal; each ask runs
+        a set-of-support search, resolving only clauses descended from
+        the negated query, so no resolvent of the KB alone is ever needed
+        (complete since the KB is consistent)
+      - cdcl: one SAT solver holding the KB's clauses, the clauses it has
+        learnt and the facts it has propagated; each ask solves under the
+        negated query as assumptions, which are undone afterwards
+
+    Clauses are simplified as they are told, keeping the KB equivalent:
+    tautologies are dropped, literals contradicting a unit clause are
+    removed (unit-subsumption), clauses subsumed by one already known are
+    dropped (forward subsumption), and known clauses subsumed by a new one
+    are removed (backward subsumption). Resolution asks do the same to
+    their resolvents, and skip KB clauses holding a pure literal, whose
+    complement appears nowhere, as they can take no part in a refutation.
+    stats counts each of these (see STATS), with "resolvents" the number
+    of resolvents kept by asks and "horn_asks" the asks answered by
+    forward chaining.
+
+    While every clause has at most one positive literal (is Horn), as do
+    the units of a negated query, asks are answered by count-based forward
+    chaining, in time linear in the clauses involved: the facts the KB
+    alone implies are derived once after each change, and each ask only
+    chains on from the facts of its negated query.
+    """
 
     def __init__(self):
         self.clauses = set()
+        # The clauses of the KB by each of their literals, and the literals
+        # of its unit clauses
+        self.index = {}
+        self.units = set()
+        self.solver = Solver()
+        # The clauses told but not yet added to the solver
+        self.pending = []
+        self.stats = dict.fromkeys(STATS, 0)
+        # The number of clauses with several positive literals, and the
+        # forward chaining closure of the KB (see horn_closure)
+        self.non_horn = 0
+        self.closure = None
 
     def tell(self, clause):
         """
@@ -21,37 +70,251 @@ class MazeKnowledgeBase:
         Note: we expect that no clause added this way will ever
         make the KB inconsistent (you need not check for this)
         """
+        stats = self.stats
+        stats["told"] += 1
+        work = [clause]
+        while work:
+            clause = work.pop()
+            if clause.is_valid():
+                stats["tautologies"] += 1
+                continue
+            for literal in clause.literals():
+                if -literal in self.units:
+                    clause = strip(clause, literal)
+                    stats["strengthened"] += 1
+            if find_subsumer(clause, self.index) is not None:
+                stats["forward_subsumed"] += 1
+                continue
+            for other in find_subsumed(clause, self.index):
+                self.remove(other)
+                stats["backward_subsumed"] += 1
+            self.add(clause)
+            if len(clause) == 1:
+                unit = clause.literals()[0]
+                self.units.add(unit)
+                for other in list(self.index.get(-unit, ())):
+                    self.remove(other)
+                    work.append(strip(other, -unit))
+                    stats["strengthened"] += 1
+
+    def add(self, clause):
         self.clauses.add(clause)
+        for literal in clause.literals():
+            self.index.setdefault(literal, {})[clause] = None
+        self.pending.append(clause)
+        self.non_horn += not is_horn(clause)
+        self.closure = None
+
+    def remove(self, clause):
+        # The solver may keep the clause, as the KB still implies it
+        self.clauses.discard(clause)
+        for literal in clause.literals():
+            del self.index[literal][clause]
+        if len(clause) == 1:
+            self.units.discard(clause.literals()[0])
+        self.non_horn -= not is_horn(clause)
+        self.closure = None
 
     def negate(self, query):
         negated_query = []
-        for prop, val in query.props.items():
-            negated_query.append(MazeClause([(prop, not val)]))
+        for literal in query.literals():
+            negated_query.append(MazeClause.from_literals((-literal,)))
         return negated_query
 
-    def ask(self, query):
+    def ask(self, query, engine="auto"):
         """
         Given a MazeClause query, returns True if the KB entails
-        the query, False otherwise
+        the query, False otherwise. The engine is one of:
+          - "auto": "horn" while the KB is Horn, "resolution" otherwise
+          - "resolution": set-of-support resolution refutation
+          - "cdcl": a CDCL SAT solver (see sat_solver.py) showing that
+            KB & ~query is unsatisfiable
+          - "horn": forward chaining, for Horn KBs only
         """
-        # TODO: Implement resolution inference here!
+        if engine not in ENGINES:
+            raise ValueError("unknown engine %r, expected one of %s" % (engine, ENGINES))
+        if engine == "auto":
+            engine = "resolution" if self.non_horn else "horn"
+        if engine == "horn":
+            return self.ask_horn(query)
+        if engine == "cdcl":
+            return self.ask_cdcl(query)
+        if MazeClause([]) in self.clauses:
+            return True
+        # Given-clause resolution: the shortest unprocessed clause of the
+        # set of support is resolved against the KB's clauses and the
+        # processed support holding the complement of one of its literals
+        # (found through the literal indexes), then joins the processed
+        # support, so every pair of clauses is resolved at most once
+        stats = self.stats
+        query_literals = set(query.literals())
+        support = {}
+        # The clauses subsumed during this ask, or holding pure literals,
+        # and those checked for pure literals
+        dead = set()
+        checked = set()
+        seen = set(self.negate(query))
+        order = itertools.count()
+        agenda = [(len(clause), next(order), clause) for clause in seen]
+        heapq.heapify(agenda)
+        while agenda:
+            given = heapq.heappop(agenda)[2]
+            if given in dead:
+                continue
+            if given.is_empty():
+                return True
+            partners = {}
+            literals = given.literals()
+            for literal in literals:
+                for other in self.index.get(-literal, ()):
+                    partners[id(other)] = other
+                for other in support.get(-literal, ()):
+                    partners[id(other)] = other
+            for other in partners.values():
+                if other in dead:
+                    continue
+                if other not in checked:
+                    checked.add(other)
+                    if any(not self.index.get(-literal) and literal not in query_literals
+                           for literal in other.literals()):
+                        dead.add(other)
+                        stats["pure_skipped"] += 1
+                        continue
+                for resolvent in MazeClause.resolve(given, other):
+                    if resolvent.is_empty():
+                        return True
+                    if resolvent in seen:
+                        continue
+                    subsumer = find_subsumer(resolvent, self.index)
+                    if subsumer is not None or find_subsumer(resolvent, support) is not None:
+                        stats["forward_subsumed"] += 1
+                        # A KB clause subsuming the resolvent joins the
+                        # support in its place
+                        resolvent = subsumer
+                        if resolvent is None or resolvent in seen:
+                            continue
+                    else:
+                        for index in (self.index, support):
+                            for subsumed in find_subsumed(resolvent, index):
+                                dead.add(subsumed)
+                                stats["backward_subsumed"] += 1
+                        stats["resolvents"] += 1
+                    seen.add(resolvent)
+                    heapq.heappush(agenda, (len(resolvent), next(order), resolvent))
+                if given in dead:
+                    break
+            if given not in dead:
+                for literal in literals:
+                    support.setdefault(literal, {})[given] = None
+        return False
 
-        all_clauses = copy.deepcopy(self.clauses)
-        print("before negate:", query)
+    def ask_cdcl(self, query):
+        solver = self.solver
+        for clause in self.pending:
+            solver.add_clause(clause.literals())
+        self.pending = []
+        return not solver.solve([-literal for literal in query.literals()])
 
-        all_clauses.update(self.negate(query))
-        print("after negate:", query)
-        new = set()
-        while True:
-            for pair in itertools.combinations(all_clauses, 2):
-                resolvents = query.resolve(pair[0], pair[1])
-                if MazeClause([]) in resolvents:
-                    return True
-                new = new | resolvents
-            if new < all_clauses:
-                return False
-            all_clauses = all_clauses | new
+    def horn_closure(self):
+        """
+        Forward chains from the positive unit clauses of the (Horn) KB,
+        returning (facts, remaining): the set of variables derived true, and
+        the number of body literals not yet true of each clause with some
+        true; facts is None if the KB is inconsistent
+        """
+        if self.closure is None:
+            self.closure = self.chain([unit for unit in self.units if unit > 0], set(), {})
+            if MazeClause([]) in self.clauses:
+                self.closure = (None, {})
+        return self.closure
 
+    def chain(self, agenda, facts, remaining, goals=(), known=frozenset()):
+        """
+        Forward chains from the variables of agenda, adding the variables
+        derived, other than those already known, to facts and lowering the
+        counts of remaining (keyed by clause, each defaulting to the
+        clause's number of negated literals).
+        Returns (facts, remaining), or (None, remaining) once a clause with
+        no positive literal has all of its body true or a variable of goals
+        is derived
+        """
+        index = self.index
+        while agenda:
+            var = agenda.pop()
+            if var in facts or var in known:
+                continue
+            if var in goals:
+                return (None, remaining)
+            facts.add(var)
+            for clause in index.get(-var, ()):
+                count = remaining.get(clause)
+                if count is None:
+                    count = sum(literal < 0 for literal in clause.literals())
+                remaining[clause] = count - 1
+                if count == 1:
+                    head = max(clause.literals())
+                    if head < 0:
+                        return (None, remaining)
+                    agenda.append(head)
+        return (facts, remaining)
+
+    def ask_horn(self, query):
+        if self.non_horn:
+            raise ValueError("the horn engine needs a Horn KB")
+        self.stats["horn_asks"] += 1
+        facts, remaining = self.horn_closure()
+        if facts is None:
+            return True
+        # The negated query makes facts of the query's negated literals, and
+        # goals of its positive ones, which must not be derived; the KB's
+        # facts and counts are layered under this ask's, not copied
+        literals = query.literals()
+        goals = {literal for literal in literals if literal > 0}
+        if not goals.isdisjoint(facts):
+            return True
+        agenda = [-literal for literal in literals if literal < 0]
+        lowered = collections.ChainMap({}, remaining)
+        return self.chain(agenda, set(), lowered, goals, facts)[0] is None
+
+
+def is_horn(clause):
+    """
+    Returns True if the clause has at most one positive literal
+    """
+    return sum(literal > 0 for literal in clause.literals()) <= 1
+
+
+def strip(clause, literal):
+    """
+    Returns the clause without the given literal
+    """
+    return MazeClause.from_literals(tuple(other for other in clause.literals()
+                                          if other != literal))
+
+
+def find_subsumer(clause, index):
+    """
+    Returns a clause of the literal index subsuming the given one, or None
+    """
+    for literal in clause.literals():
+        for other in index.get(literal, ()):
+            if other.subsumes(clause):
+                return other
+    return None
+
+
+def find_subsumed(clause, index):
+    """
+    Returns the list of the clauses of the literal index, other than the
+    given one, that it subsumes; each holds all of its literals, so only
+    those holding its rarest literal are tried
+    """
+    literals = clause.literals()
+    if not literals:
+        return []
+    rarest = min(literals, key=lambda literal: len(index.get(literal, ())))
+    return [other for other in index.get(rarest, ())
+            if other is not clause and other != clause and clause.subsumes(other)]
 
 
 class MazeKnowledgeBaseTests(unittest.TestCase):
@@ -104,6 +367,123 @@ class MazeKnowledgeBaseTests(unittest.TestCase):
         kb.tell(MazeClause([(("Y", (1, 1)), True)]))
         self.assertTrue(kb.ask(MazeClause([(("Z", (1, 1)), False)])))
 
+    def test_mazekb_chain(self):
+        # A long chain of implications X(0) => X(1) => ... => X(n)
+        kb = MazeKnowledgeBase()
+        n = 300
+        for i in range(n):
+            kb.tell(MazeClause([(("X", (i, 0)), False), (("X", (i + 1, 0)), True)]))
+        kb.tell(MazeClause([(("X", (0, 0)), True)]))
+        self.assertTrue(kb.ask(MazeClause([(("X", (n, 0)), True)])))
+        # Without the chain's start, nothing about its end is entailed
+        kb = MazeKnowledgeBase()
+        for i in range(40):
+            kb.tell(MazeClause([(("X", (i, 0)), False), (("X", (i + 1, 0)), True)]))
+        self.assertFalse(kb.ask(MazeClause([(("X", (40, 0)), True)])))
+
+    def test_mazekb_cdcl(self):
+        kb = MazeKnowledgeBase()
+        kb.tell(MazeClause([(("X", (1, 1)), False), (("Y", (1, 1)), True), (("W", (1, 1)), True)]))
+        kb.tell(MazeClause([(("W", (1, 1)), False), (("Z", (1, 1)), False), (("S", (1, 1)), True)]))
+        kb.tell(MazeClause([(("S", (1, 1)), False), (("T", (1, 1)), False)]))
+        kb.tell(MazeClause([(("X", (1, 1)), True), (("T", (1, 1)), True)]))
+        kb.tell(MazeClause([(("W", (1, 1)), True)]))
+        kb.tell(MazeClause([(("T", (1, 1)), True)]))
+        kb.tell(MazeClause([(("X", (1, 1)), True), (("X", (1, 1)), False)]))
+        queries = [[(("Z", (1, 1)), False)],
+                   [(("Z", (1, 1)), True), (("W", (1, 1)), True)],
+                   [(("Z", (1, 1)), True)],
+                   [(("Y", (1, 1)), True)],
+                   [(("S", (1, 1)), False), (("X", (1, 1)), True)]]
+        for query in queries:
+            self.assertEqual(kb.ask(MazeClause(query), engine="cdcl"),
+                             kb.ask(MazeClause(query)))
+        with self.assertRaises(ValueError):
+            kb.ask(MazeClause(queries[0]), engine="dpll")
+
+        # A chain far too long to saturate by resolution
+        kb = MazeKnowledgeBase()
+        n = 3000
+        for i in range(n):
+            kb.tell(MazeClause([(("X", (i, 0)), False), (("X", (i + 1, 0)), True)]))
+        self.assertFalse(kb.ask(MazeClause([(("X", (n, 0)), True)]), engine="cdcl"))
+        kb.tell(MazeClause([(("X", (0, 0)), True)]))
+        self.assertTrue(kb.ask(MazeClause([(("X", (n, 0)), True)]), engine="cdcl"))
+
+    def test_mazekb_incremental(self):
+        kb = MazeKnowledgeBase()
+        solver = kb.solver
+        x, y, z = ("X", (1, 1)), ("Y", (1, 1)), ("Z", (1, 1))
+        kb.tell(MazeClause([(x, False), (y, True)]))
+        for engine in ENGINES:
+            self.assertFalse(kb.ask(MazeClause([(y, True)]), engine))
+            self.assertTrue(kb.ask(MazeClause([(x, False), (y, True)]), engine))
+        kb.tell(MazeClause([(x, True)]))
+        kb.tell(MazeClause([(x, True)]))
+        kb.tell(MazeClause([(y, False), (z, True)]))
+        self.assertEqual(len(kb.clauses), 3)
+        for engine in ENGINES:
+            self.assertTrue(kb.ask(MazeClause([(z, True)]), engine))
+            self.assertFalse(kb.ask(MazeClause([(z, False)]), engine))
+            # Queries are never told: asking twice gives the same answer
+            self.assertFalse(kb.ask(MazeClause([(z, False)]), engine))
+        # The solver's facts, propagated from the KB alone, persist
+        self.assertTrue(kb.solver is solver)
+        self.assertEqual(solver.value(prop_id(z) + 1), 1)
+
+    def test_mazekb_simplify(self):
+        kb = MazeKnowledgeBase()
+        a, b, c, d = (("A", (1, 1)), ("B", (1, 1)), ("C", (1, 1)), ("D", (1, 1)))
+        kb.tell(MazeClause([(a, True), (b, True), (c, True)]))
+        kb.tell(MazeClause([(a, True), (b, True)]))
+        kb.tell(MazeClause([(a, True), (b, True), (d, True)]))
+        self.assertEqual(kb.clauses, {MazeClause([(a, True), (b, True)])})
+        kb.tell(MazeClause([(a, True), (a, False)]))
+        kb.tell(MazeClause([(a, False)]))
+        kb.tell(MazeClause([(a, True), (c, True)]))
+        self.assertEqual(kb.clauses, {MazeClause([(a, False)]), MazeClause([(b, True)]),
+                                      MazeClause([(c, True)])})
+        self.assertEqual(kb.stats, {"told": 6, "tautologies": 1, "strengthened": 2,
+                                    "forward_subsumed": 1, "backward_subsumed": 1,
+                                    "resolvents": 0, "pure_skipped": 0, "horn_asks": 0})
+        for engine in ENGINES:
+            self.assertTrue(kb.ask(MazeClause([(b, True), (d, True)]), engine))
+            self.assertFalse(kb.ask(MazeClause([(d, True)]), engine))
+
+    def test_mazekb_horn(self):
+        kb = MazeKnowledgeBase()
+        n = 5000
+        for i in range(n):
+            kb.tell(MazeClause([(("X", (i, 0)), False), (("X", (i + 1, 0)), True)]))
+            kb.tell(MazeClause([(("X", (i, 0)), False), (("Y", (i, 0)), False),
+                                (("Z", (i, 0)), True)]))
+        kb.tell(MazeClause([(("X", (0, 0)), True)]))
+        self.assertTrue(kb.ask(MazeClause([(("X", (n, 0)), True)])))
+        self.assertFalse(kb.ask(MazeClause([(("Z", (5, 0)), True)])))
+        self.assertTrue(kb.ask(MazeClause([(("Z", (5, 0)), True), (("Y", (5, 0)), False)])))
+        self.assertFalse(kb.ask(MazeClause([(("Y", (5, 0)), False)])))
+        self.assertEqual(kb.stats["horn_asks"], 4)
+
+        # Forward chaining agrees with the other engines, until a clause
+        # with two positive literals sends asks back to resolution
+        kb = MazeKnowledgeBase()
+        x, y, z, w = (("X", (1, 1)), ("Y", (1, 1)), ("Z", (1, 1)), ("W", (1, 1)))
+        kb.tell(MazeClause([(x, False), (y, True)]))
+        kb.tell(MazeClause([(y, False), (z, False), (w, True)]))
+        kb.tell(MazeClause([(w, False), (x, False)]))
+        queries = [[(x, False)], [(x, True)], [(y, False), (z, False)], [(z, False), (x, False)],
+                   [(w, True), (z, False)], [(y, True), (w, False)]]
+        for query in queries:
+            self.assertEqual({kb.ask(MazeClause(query), engine) for engine in ENGINES},
+                             {kb.ask(MazeClause(query), "resolution")})
+        asks = kb.stats["horn_asks"]
+        kb.tell(MazeClause([(x, True), (z, True)]))
+        self.assertTrue(kb.ask(MazeClause([(y, True), (z, True)])))
+        self.assertFalse(kb.ask(MazeClause([(z, True)])))
+        self.assertEqual(kb.stats["horn_asks"], asks)
+        with self.assertRaises(ValueError):
+            kb.ask(MazeClause([(z, True)]), "horn")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,394 @@
+'''
+sat_solver.py
+
+A conflict-driven clause learning (CDCL) SAT solver in pure Python,
+used by MazeKnowledgeBase.ask to decide entailment: the KB entails a
+query exactly when KB & ~query is unsatisfiable.
+
+Clauses are lists of signed literals as given by MazeClause.literals:
+variable v (a proposition id + 1) is the literal +v, and its negation
+is -v. The solver uses:
+  - two watched literals per clause for unit propagation
+  - first unique implication point (1UIP) conflict analysis, learning
+    one clause per conflict and backjumping
+  - VSIDS-style branching on the most active variable, with saved phases
+  - restarts after a Luby sequence of conflict counts
+  - assumptions (MiniSat style), so one solver can answer many queries
+'''
+import unittest
+import heapq
+import itertools
+import random
+
+# Conflicts between restarts, times the Luby sequence
+RESTART_UNIT = 100
+
+# Activity decay per conflict, and the bound past which activities are
+# scaled back down
+ACTIVITY_DECAY = 0.95
+ACTIVITY_LIMIT = 1e100
+
+
+def luby(i):
+    """
+    Returns the i-th term (from 0) of the Luby sequence 1, 1, 2, 1, 1, 2,
+    4, 1, 1, 2, 1, 1, 2, 4, 8, ...
+    """
+    size, power = 1, 0
+    while size < i + 1:
+        power += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        power -= 1
+        i %= size
+    return 1 << power
+
+
+class Solver:
+
+    def __init__(self):
+        self.ok = True
+        # Per variable (index 0 unused): value (1 true, -1 false, 0 unset),
+        # decision level, reason clause, activity and saved phase
+        self.assigns = [0]
+        self.level = [0]
+        self.reason = [None]
+        self.activity = [0.0]
+        self.phase = [False]
+        self.watches = {}
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.order = []
+        self.var_inc = 1.0
+        self.clauses = []
+        self.learnts = []
+        self.conflicts = 0
+        self.decisions = 0
+        self.propagations = 0
+        self.model = None
+
+    def num_vars(self):
+        return len(self.assigns) - 1
+
+    def reserve(self, var):
+        """
+        Makes room for the variables up to var
+        """
+        while len(self.assigns) <= var:
+            v = len(self.assigns)
+            self.assigns.append(0)
+            self.level.append(0)
+            self.reason.append(None)
+            self.activity.append(0.0)
+            self.phase.append(False)
+            self.watches[v] = []
+            self.watches[-v] = []
+            heapq.heappush(self.order, (0.0, v))
+
+    def value(self, literal):
+        """
+        Returns 1 if the literal is true, -1 if it is false, 0 if unset
+        """
+        value = self.assigns[abs(literal)]
+        return value if literal > 0 else -value
+
+    def add_clause(self, literals):
+        """
+        Adds the clause of the given literals, returning False if the
+        clauses have become unsatisfiable
+        """
+        if not self.ok:
+            return False
+        self.cancel_until(0)
+        clause = []
+        for literal in sorted(set(literals), key=abs):
+            if -literal in clause:
+                return True
+            self.reserve(abs(literal))
+            value = self.value(literal)
+            if value > 0:
+                return True
+            if value == 0:
+                clause.append(literal)
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self.enqueue(clause[0], None)
+            self.ok = self.propagate() is None
+        else:
+            self.attach(clause)
+            self.clauses.append(clause)
+        return self.ok
+
+    def attach(self, clause):
+        self.watches[clause[0]].append(clause)
+        self.watches[clause[1]].append(clause)
+
+    def enqueue(self, literal, reason):
+        var = abs(literal)
+        self.assigns[var] = 1 if literal > 0 else -1
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(literal)
+
+    def propagate(self):
+        """
+        Propagates the literals on the trail not yet propagated, returning
+        a conflicting clause, or None
+        """
+        assigns = self.assigns
+        watches = self.watches
+        trail = self.trail
+        while self.qhead < len(trail):
+            false_literal = -trail[self.qhead]
+            self.qhead += 1
+            self.propagations += 1
+            watching = watches[false_literal]
+            kept = []
+            for k, clause in enumerate(watching):
+                # Keep the false literal second, and the other watch first
+                if clause[0] == false_literal:
+                    clause[0] = clause[1]
+                    clause[1] = false_literal
+                first = clause[0]
+                value = assigns[abs(first)]
+                if (value if first > 0 else -value) > 0:
+                    kept.append(clause)
+                    continue
+                for m in range(2, len(clause)):
+                    other = clause[m]
+                    value = assigns[abs(other)]
+                    if (value if other > 0 else -value) >= 0:
+                        clause[1] = other
+                        clause[m] = false_literal
+                        watches[other].append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    value = assigns[abs(first)]
+                    if (value if first > 0 else -value) < 0:
+                        kept.extend(watching[k + 1:])
+                        watches[false_literal] = kept
+                        self.qhead = len(trail)
+                        return clause
+                    self.enqueue(first, clause)
+            watches[false_literal] = kept
+        return None
+
+    def analyze(self, conflict):
+        """
+        Derives the 1UIP clause of the conflict, returning it (asserting
+        literal first, a literal of the backjump level second) and the
+        level to backjump to
+        """
+        seen = set()
+        learnt = [None]
+        level = self.level
+        current = len(self.trail_lim)
+        pending = 0
+        index = len(self.trail) - 1
+        clause = conflict
+        literal = None
+        while True:
+            for other in (clause if literal is None else clause[1:]):
+                var = abs(other)
+                if var not in seen and level[var] > 0:
+                    seen.add(var)
+                    self.bump(var)
+                    if level[var] >= current:
+                        pending += 1
+                    else:
+                        learnt.append(other)
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            literal = self.trail[index]
+            index -= 1
+            clause = self.reason[abs(literal)]
+            pending -= 1
+            if pending == 0:
+                break
+        learnt[0] = -literal
+
+        back = 0
+        if len(learnt) > 1:
+            deepest = max(range(1, len(learnt)), key=lambda i: level[abs(learnt[i])])
+            learnt[1], learnt[deepest] = learnt[deepest], learnt[1]
+            back = level[abs(learnt[1])]
+        return (learnt, back)
+
+    def bump(self, var):
+        activity = self.activity
+        activity[var] += self.var_inc
+        if activity[var] > ACTIVITY_LIMIT:
+            for v in range(1, len(activity)):
+                activity[v] /= ACTIVITY_LIMIT
+            self.var_inc /= ACTIVITY_LIMIT
+            self.order = [(-activity[v], v) for v in range(1, len(activity))
+                          if self.assigns[v] == 0]
+            heapq.heapify(self.order)
+        elif self.assigns[var] == 0:
+            heapq.heappush(self.order, (-activity[var], var))
+
+    def cancel_until(self, level):
+        """
+        Undoes the assignments above the given decision level
+        """
+        if len(self.trail_lim) <= level:
+            return
+        start = self.trail_lim[level]
+        activity = self.activity
+        for literal in self.trail[start:]:
+            var = abs(literal)
+            self.assigns[var] = 0
+            self.reason[var] = None
+            self.phase[var] = literal > 0
+            heapq.heappush(self.order, (-activity[var], var))
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = start
+
+    def pick_branch(self):
+        """
+        Returns the literal to decide on next, or None once every variable
+        is assigned
+        """
+        order = self.order
+        while order:
+            negated, var = heapq.heappop(order)
+            # Entries are left behind when a variable is assigned or bumped
+            if self.assigns[var] == 0 and -negated == self.activity[var]:
+                return var if self.phase[var] else -var
+        return None
+
+    def search(self, budget, assumptions):
+        """
+        Searches until budget conflicts have been met, returning True if
+        the clauses are satisfiable under the assumptions, False if not,
+        or None at the budget
+        """
+        conflicts = 0
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                conflicts += 1
+                self.conflicts += 1
+                if not self.trail_lim:
+                    self.ok = False
+                    return False
+                learnt, back = self.analyze(conflict)
+                self.cancel_until(back)
+                if len(learnt) == 1:
+                    self.enqueue(learnt[0], None)
+                else:
+                    self.attach(learnt)
+                    self.learnts.append(learnt)
+                    self.enqueue(learnt[0], learnt)
+                self.var_inc /= ACTIVITY_DECAY
+                continue
+
+            if conflicts >= budget:
+                return None
+            level = len(self.trail_lim)
+            if level < len(assumptions):
+                literal = assumptions[level]
+                value = self.value(literal)
+                if value < 0:
+                    return False
+                if value > 0:
+                    # Already implied; open an empty level to keep the
+                    # assumptions lined up with the levels
+                    self.trail_lim.append(len(self.trail))
+                    continue
+            else:
+                literal = self.pick_branch()
+                if literal is None:
+                    return True
+                self.decisions += 1
+            self.trail_lim.append(len(self.trail))
+            self.enqueue(literal, None)
+
+    def solve(self, assumptions=()):
+        """
+        Returns True if the clauses are satisfiable with every literal of
+        assumptions true, leaving the true literals of a satisfying
+        assignment in model, False otherwise; clauses learnt along the way
+        are kept for later calls
+        """
+        if not self.ok:
+            return False
+        for literal in assumptions:
+            self.reserve(abs(literal))
+        assumptions = list(assumptions)
+        try:
+            for restart in itertools.count():
+                result = self.search(luby(restart) * RESTART_UNIT, assumptions)
+                if result:
+                    self.model = [v if self.assigns[v] > 0 else -v
+                                  for v in range(1, len(self.assigns))]
+                if result is not None:
+                    return result
+                self.cancel_until(0)
+        finally:
+            self.cancel_until(0)
+
+
+class SolverTests(unittest.TestCase):
+
+    def brute_force(self, clauses, variables):
+        for values in itertools.product((1, -1), repeat=variables):
+            if all(any(values[abs(l) - 1] * l > 0 for l in clause) for clause in clauses):
+                return True
+        return False
+
+    def test_luby(self):
+        self.assertEqual([luby(i) for i in range(15)],
+                         [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8])
+
+    def test_random(self):
+        rng = random.Random(485)
+        for _ in range(300):
+            variables = rng.randint(3, 10)
+            clauses = [[rng.choice((1, -1)) * rng.randint(1, variables)
+                        for _ in range(rng.randint(1, 3))]
+                       for _ in range(rng.randint(1, 5 * variables))]
+            solver = Solver()
+            for clause in clauses:
+                solver.add_clause(clause)
+            expected = self.brute_force(clauses, variables)
+            self.assertEqual(solver.solve(), expected)
+            if expected:
+                true = set(solver.model)
+                self.assertTrue(all(any(l in true for l in c) for c in clauses))
+
+    def test_pigeonhole(self):
+        # 6 pigeons never fit into 5 holes; var(p, h) says pigeon p is in h
+        pigeons, holes = 6, 5
+        solver = Solver()
+        var = lambda p, h: p * holes + h + 1
+        for p in range(pigeons):
+            solver.add_clause([var(p, h) for h in range(holes)])
+        for h in range(holes):
+            for p, q in itertools.combinations(range(pigeons), 2):
+                solver.add_clause([-var(p, h), -var(q, h)])
+        self.assertFalse(solver.solve())
+        self.assertTrue(solver.conflicts > 0)
+
+    def test_assumptions(self):
+        solver = Solver()
+        solver.add_clause([-1, 2])
+        solver.add_clause([-2, 3])
+        self.assertTrue(solver.solve())
+        self.assertFalse(solver.solve([1, -3]))
+        self.assertTrue(solver.solve([1, 3]))
+        self.assertTrue(solver.solve([-3]))
+        solver.add_clause([1])
+        self.assertFalse(solver.solve([-3]))
+        self.assertTrue(solver.solve())
+        solver.add_clause([-3])
+        self.assertFalse(solver.solve())
+
+
+if __name__ == "__main__":
+    unittest.main()